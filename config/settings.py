@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from datetime import timedelta
 from pathlib import Path
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -39,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework_simplejwt',
@@ -148,18 +150,112 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'habits.renderers.ORJSONRenderer',
+        'habits.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'habits.parsers.ORJSONParser',
+        'habits.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+REDIS_URL = os.getenv('REDIS_URL') or 'redis://localhost:6379/0'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'habit_tracker',
+    }
+}
+
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND')
 
+# Интервал записи отметок о выполнении привычек из буфера redis в базу в секундах.
+HABITS_COMPLETION_FLUSH_INTERVAL = int(os.getenv('HABITS_COMPLETION_FLUSH_INTERVAL') or 10)
+# Максимальный возраст списков популярных действий, мест и публичных привычек в секундах.
+# Celery beat пересчитывает их вдвое чаще, более старые списки пересчитываются при запросе.
+HABITS_POPULARITY_MAX_AGE = int(os.getenv('HABITS_POPULARITY_MAX_AGE') or 600)
+# Количество элементов в списках популярности.
+HABITS_POPULARITY_TOP = int(os.getenv('HABITS_POPULARITY_TOP') or 10)
+
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-due-habits': {
+        'task': 'habits.tasks.dispatch_due_habits',
+        'schedule': crontab(),
+    },
+    'process-schedule-outbox': {
+        'task': 'habits.tasks.process_schedule_outbox',
+        'schedule': crontab(),
+    },
+    'flush-habit-completions': {
+        'task': 'habits.tasks.flush_habit_completions',
+        'schedule': timedelta(seconds=HABITS_COMPLETION_FLUSH_INTERVAL),
+    },
+    'expire-habit-streaks': {
+        'task': 'habits.tasks.expire_habit_streaks',
+        'schedule': crontab(minute=0),
+    },
+    'refresh-habit-popularity': {
+        'task': 'habits.tasks.refresh_habit_popularity',
+        'schedule': timedelta(seconds=HABITS_POPULARITY_MAX_AGE / 2),
+    },
+}
+
 BOT_API_TOKEN = os.getenv('BOT_API_TOKEN')
 
+# Адрес Bot API можно заменить на локальный сервер-заглушку для тестов.
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL') or 'https://api.telegram.org'
+TELEGRAM_TIMEOUT = float(os.getenv('TELEGRAM_TIMEOUT') or 10)
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE') or 10)
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES') or 3)
+# Ограничения Telegram на количество сообщений в секунду: всего и в один чат.
+TELEGRAM_GLOBAL_RATE_LIMIT = float(os.getenv('TELEGRAM_GLOBAL_RATE_LIMIT') or 30)
+TELEGRAM_CHAT_RATE_LIMIT = float(os.getenv('TELEGRAM_CHAT_RATE_LIMIT') or 1)
+# Секретный токен вебхука бота (secret_token в setWebhook), без него вебхук отклоняет запросы.
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+
+# Режим планирования напоминаний:
+# 'periodic_task' - отдельная периодическая задача celery beat на каждую привычку,
+# 'dispatcher' - одна задача beat раз в минуту отбирает привычки, время которых наступило, по индексу в базе,
+# 'redis' - то же, но время напоминаний хранится в отсортированном множестве redis.
+HABITS_SCHEDULER = os.getenv('HABITS_SCHEDULER') or 'periodic_task'
+HABITS_DISPATCH_BATCH_SIZE = int(os.getenv('HABITS_DISPATCH_BATCH_SIZE') or 500)
+# Время хранения страниц ленты публичных привычек в кэше в секундах.
+HABITS_PUBLIC_FEED_CACHE_TIMEOUT = int(os.getenv('HABITS_PUBLIC_FEED_CACHE_TIMEOUT') or 300)
+# Количество изменений расписания из outbox, применяемых за одну транзакцию.
+HABITS_OUTBOX_BATCH_SIZE = int(os.getenv('HABITS_OUTBOX_BATCH_SIZE') or 1000)
+# Объединять напоминания одного пользователя, наступившие в одну минуту, в одно сообщение
+# (для пользователей, у которых включен признак coalesce_reminders).
+HABITS_COALESCE_REMINDERS = (os.getenv('HABITS_COALESCE_REMINDERS') or 'True') == 'True'
+# Формировать списки привычек, мест и действий из queryset.values() без создания объектов модели и сериализатора
+# на каждую строку. Ответ совпадает с ответом сериализатора.
+HABITS_FAST_SERIALIZATION = (os.getenv('HABITS_FAST_SERIALIZATION') or 'False') == 'True'
+# Количество привычек, читаемых из базы за один раз при потоковой выгрузке.
+HABITS_EXPORT_CHUNK_SIZE = int(os.getenv('HABITS_EXPORT_CHUNK_SIZE') or 2000)
+# Максимальное количество операций в одном запросе пакетного изменения привычек.
+HABITS_BULK_MAX_OPERATIONS = int(os.getenv('HABITS_BULK_MAX_OPERATIONS') or 1000)
+# Количество подсказок при вводе названия места или действия по умолчанию и максимальное.
+HABITS_SEARCH_SUGGEST_LIMIT = int(os.getenv('HABITS_SEARCH_SUGGEST_LIMIT') or 10)
+HABITS_SEARCH_SUGGEST_MAX_LIMIT = int(os.getenv('HABITS_SEARCH_SUGGEST_MAX_LIMIT') or 50)
+# Сходство названий (от 0 до 1), начиная с которого при создании места или действия предлагаются похожие записи.
+HABITS_DUPLICATE_SIMILARITY = float(os.getenv('HABITS_DUPLICATE_SIMILARITY') or 0.7)
+# Количество отметок о выполнении привычек, записываемых в базу одним bulk_create.
+HABITS_COMPLETION_BATCH_SIZE = int(os.getenv('HABITS_COMPLETION_BATCH_SIZE') or 1000)
+# Время в секундах, после которого отметки из списка обработки воркера, не зафиксировавшего транзакцию,
+# возвращаются в буфер. Должно быть больше времени записи одной пачки.
+HABITS_COMPLETION_PROCESSING_TIMEOUT = int(os.getenv('HABITS_COMPLETION_PROCESSING_TIMEOUT') or 300)
+
 CORS_ALLOWED_ORIGINS = [
     "https://read-only.example.com",
     "https://read-and-write.example.com",
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from habits.models import Place, Action, Habit
+from habits.models import Place, Action, Habit, ScheduleOutbox, HabitCompletion, HabitStats
 
 
 @admin.register(Place)
@@ -16,3 +16,18 @@ class ActionAdmin(admin.ModelAdmin):
 @admin.register(Habit)
 class HabitAdmin(admin.ModelAdmin):
     list_display = ('pk', 'owner', 'action', 'time_to_perform', 'place',)
+
+
+@admin.register(ScheduleOutbox)
+class ScheduleOutboxAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'habit_id', 'operation', 'created_at',)
+
+
+@admin.register(HabitCompletion)
+class HabitCompletionAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'habit', 'date', 'completed_at', 'source',)
+
+
+@admin.register(HabitStats)
+class HabitStatsAdmin(admin.ModelAdmin):
+    list_display = ('habit', 'current_streak', 'longest_streak', 'last_period',)
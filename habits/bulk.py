@@ -0,0 +1,109 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+
+from habits.cache import bump_public_feed_version
+from habits.models import Habit, ScheduleOutbox
+from habits.serializers import HabitSerializer, HabitOperationSerializer, get_related_objects
+from habits.tasks import enqueue_schedule_changes
+from habits.validators import patch_validator
+
+
+def apply_habit_operations(user, operations, atomic=True):
+    """
+    Выполняет операции создания, изменения и удаления привычек пользователя в одной транзакции.
+    Все операции валидируются до записи, связанные объекты и изменяемые привычки загружаются заранее,
+    запись выполняется через bulk_create, bulk_update и одно удаление, расписания создаются одной пачкой через outbox.
+    Возвращает результаты операций в порядке запроса, при atomic=True и наличии ошибок ничего не записывает.
+    """
+
+    results = [{'index': index, 'op': operation['op']} for index, operation in enumerate(operations)]
+    pks = [operation['id'] for operation in operations if operation['op'] != HabitOperationSerializer.CREATE]
+    habits = Habit.objects.in_bulk(pks)
+    context = {'related_objects': get_related_objects(
+        HabitSerializer(), [operation['data'] for operation in operations if 'data' in operation])}
+
+    creates, updates, deletes = [], [], []
+    seen = set()
+    for result, operation in zip(results, operations):
+        op = operation['op']
+        habit = None
+        if op != HabitOperationSerializer.CREATE:
+            habit = habits.get(operation['id'])
+            if habit is None:
+                result['errors'] = {'id': ['Привычка не найдена.']}
+                continue
+            if not user.is_staff and habit.owner_id != user.pk:
+                result['errors'] = {'id': ['Нет прав на изменение привычки.']}
+                continue
+            if habit.pk in seen:
+                result['errors'] = {'id': ['Привычка уже изменяется другой операцией запроса.']}
+                continue
+            seen.add(habit.pk)
+            result['id'] = habit.pk
+        if op == HabitOperationSerializer.DELETE:
+            deletes.append((result, habit))
+            continue
+
+        serializer = HabitSerializer(habit, data=operation['data'], partial=habit is not None, context=context)
+        if not serializer.is_valid():
+            result['errors'] = serializer.errors
+            continue
+        validated_data = serializer.validated_data
+        if habit is None:
+            creates.append((result, Habit(**{**validated_data, 'owner': user})))
+            continue
+        try:
+            patch_validator(habit, validated_data)
+        except ValidationError as error:
+            result['errors'] = {'non_field_errors': error.detail}
+            continue
+        for attr, value in validated_data.items():
+            setattr(habit, attr, value)
+        updates.append((result, habit, set(validated_data)))
+
+    delete_pks = {habit.pk for _, habit in deletes}
+    if delete_pks:
+        protected = set(Habit.objects.filter(pleasure_habit__in=delete_pks).exclude(pk__in=delete_pks)
+                        .values_list('pleasure_habit_id', flat=True))
+        for result, habit in [*creates, *((result, habit) for result, habit, _ in updates)]:
+            if habit.pleasure_habit_id in delete_pks:
+                result['errors'] = {'pleasure_habit': ['Связанная привычка удаляется этим же запросом.']}
+        for result, habit in deletes:
+            if habit.pk in protected:
+                result['errors'] = {'id': ['Привычка используется как связанная в других привычках.']}
+        creates = [item for item in creates if 'errors' not in item[0]]
+        updates = [item for item in updates if 'errors' not in item[0]]
+        deletes = [item for item in deletes if 'errors' not in item[0]]
+
+    if atomic and any('errors' in result for result in results):
+        for result in results:
+            result['status'] = 'error' if 'errors' in result else 'skipped'
+        return results
+
+    with transaction.atomic():
+        created = Habit.objects.bulk_create([habit for _, habit in creates])
+        if updates:
+            now = timezone.now()
+            for _, habit, _ in updates:
+                habit.updated_at = now
+            fields = set.union(*(fields for _, _, fields in updates)) | {'updated_at'}
+            Habit.objects.bulk_update([habit for _, habit, _ in updates], fields)
+        if deletes:
+            Habit.objects.filter(pk__in=[habit.pk for _, habit in deletes]).delete()
+
+        scheduled = [habit.pk for habit in created] + [habit.pk for _, habit, _ in updates]
+        if scheduled:
+            enqueue_schedule_changes(scheduled, ScheduleOutbox.SET)
+        if deletes:
+            enqueue_schedule_changes([habit.pk for _, habit in deletes], ScheduleOutbox.DELETE)
+        # bulk_create и bulk_update не отправляют сигналы, сбрасывающие кэш ленты, удаление отправляет их само.
+        changed = [*created, *(habit for _, habit, _ in updates)]
+        if any(habit.is_public or habit.loaded_is_public for habit in changed):
+            transaction.on_commit(bump_public_feed_version)
+
+    for result, habit in creates:
+        result['id'] = habit.pk
+    for result in results:
+        result['status'] = 'error' if 'errors' in result else 'ok'
+    return results
@@ -0,0 +1,101 @@
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+
+from config import settings
+from habits.models import Action, Place
+from habits.services import get_redis
+
+PUBLIC_FEED_VERSION_KEY = 'habits:public_feed:version'
+PUBLIC_FEED_HITS_KEY = 'habits:public_feed:hits'
+PUBLIC_FEED_MISSES_KEY = 'habits:public_feed:misses'
+
+
+class CatalogNameCache:
+    """
+    Кэш названий действий и мест в памяти процесса воркера.
+    Сбрасывается при изменении версии справочников в redis, которую увеличивают сигналы сохранения и удаления.
+    """
+
+    version_key = 'habits:catalog:version'
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.version = None
+        self.names = {Action: {}, Place: {}}
+
+    def bump_version(self):
+        """ Увеличивает версию справочников, сбрасывая кэш во всех процессах. """
+
+        get_redis().incr(self.version_key)
+
+    def check_version(self):
+        """ Очищает кэш, если версия справочников в redis изменилась. """
+
+        version = get_redis().get(self.version_key)
+        if version != self.version:
+            self.version = version
+            for names in self.names.values():
+                names.clear()
+
+    def get_names(self, model, pks):
+        """ Возвращает названия объектов справочника по первичным ключам, недостающие загружает одним запросом. """
+
+        names = self.names[model]
+        missing = set(pks) - names.keys()
+        if missing:
+            if len(names) + len(missing) > self.max_size:
+                names.clear()
+            names.update(model.objects.filter(pk__in=missing).values_list('pk', 'name'))
+        return {pk: names.get(pk) for pk in pks}
+
+    def resolve(self, habits):
+        """ Подставляет в привычки действия и места с названиями из кэша без запроса к базе на каждую привычку. """
+
+        self.check_version()
+        action_names = self.get_names(Action, {habit.action_id for habit in habits})
+        place_names = self.get_names(Place, {habit.place_id for habit in habits})
+        for habit in habits:
+            habit.action = Action(pk=habit.action_id, name=action_names[habit.action_id])
+            habit.place = Place(pk=habit.place_id, name=place_names[habit.place_id])
+        return habits
+
+
+catalog_names = CatalogNameCache()
+
+
+def bump_public_feed_version():
+    """ Увеличивает версию ленты публичных привычек, после чего все закэшированные страницы устаревают. """
+
+    get_redis().incr(PUBLIC_FEED_VERSION_KEY)
+
+
+def get_public_feed_key(request):
+    """ Возвращает ключ кэша страницы ленты публичных привычек по текущей версии ленты и параметрам запроса. """
+
+    version = int(get_redis().get(PUBLIC_FEED_VERSION_KEY) or 0)
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return f'habits:public_feed:{version}:{params}'
+
+
+def get_public_feed_page(request):
+    """ Возвращает закэшированные данные страницы ленты публичных привычек и ключ кэша страницы. """
+
+    key = get_public_feed_key(request)
+    data = cache.get(key)
+    get_redis().incr(PUBLIC_FEED_MISSES_KEY if data is None else PUBLIC_FEED_HITS_KEY)
+    return key, data
+
+
+def set_public_feed_page(key, data):
+    """ Сохраняет данные страницы ленты публичных привычек в кэш. """
+
+    cache.set(key, data, timeout=settings.HABITS_PUBLIC_FEED_CACHE_TIMEOUT)
+
+
+def get_public_feed_stats():
+    """ Возвращает количество попаданий и промахов кэша ленты публичных привычек. """
+
+    hits, misses = (int(value or 0) for value in get_redis().mget(PUBLIC_FEED_HITS_KEY, PUBLIC_FEED_MISSES_KEY))
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 4) if total else None}
@@ -0,0 +1,149 @@
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import orjson
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from config import settings
+
+from habits.models import Habit, HabitCompletion
+from habits.services import get_redis
+from habits.stats import update_stats
+
+# Список redis с отметками о выполнении привычек, ожидающими записи в базу.
+COMPLETIONS_KEY = 'habits:completions'
+
+# Префикс ключей redis, отмечающих выполнение привычки за период до записи в базу.
+COMPLETION_KEY_PREFIX = 'habits:completion'
+
+# Добавляет отметку в список, только если за этот период привычка еще не отмечена (ключ KEYS[1] не существует).
+# Возвращает длину списка после добавления или 0 для повторной отметки.
+ENQUEUE_SCRIPT = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[2]) then
+    return redis.call('RPUSH', KEYS[2], ARGV[1])
+end
+return 0
+"""
+
+# Атомарно переносит из начала списка KEYS[1] не больше ARGV[1] отметок в список обработки KEYS[2]
+# и регистрирует его в множестве KEYS[3] со временем ARGV[2]. Отметки удаляются из списка обработки только после
+# фиксации транзакции, поэтому при падении воркера до фиксации они не теряются.
+DRAIN_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, ARGV[1] - 1)
+if #items == 0 then
+    return items
+end
+redis.call('LTRIM', KEYS[1], #items, -1)
+for i = 1, #items, 1000 do
+    redis.call('RPUSH', KEYS[2], unpack(items, i, math.min(i + 999, #items)))
+end
+redis.call('ZADD', KEYS[3], ARGV[2], KEYS[2])
+return items
+"""
+
+# Атомарно возвращает отметки из списков обработки KEYS[3..] в список KEYS[1] и удаляет их из множества KEYS[2].
+REQUEUE_SCRIPT = """
+local count = 0
+for k = 3, #KEYS do
+    local items = redis.call('LRANGE', KEYS[k], 0, -1)
+    for i = 1, #items, 1000 do
+        redis.call('RPUSH', KEYS[1], unpack(items, i, math.min(i + 999, #items)))
+    end
+    count = count + #items
+    redis.call('DEL', KEYS[k])
+    redis.call('ZREM', KEYS[2], KEYS[k])
+end
+return count
+"""
+
+
+def get_processing_set_key():
+    """ Возвращает ключ множества списков обработки отметок. """
+
+    return f'{COMPLETIONS_KEY}:processing'
+
+
+def requeue_completions(processing_keys):
+    """ Возвращает отметки из списков обработки в буфер и возвращает их количество. """
+
+    if not processing_keys:
+        return 0
+    return get_redis().eval(REQUEUE_SCRIPT, 2 + len(processing_keys), COMPLETIONS_KEY, get_processing_set_key(),
+                            *processing_keys)
+
+
+def recover_completions():
+    """
+    Возвращает в буфер отметки из списков обработки старше HABITS_COMPLETION_PROCESSING_TIMEOUT секунд,
+    оставшихся после воркеров, завершившихся до фиксации транзакции.
+    """
+
+    stale_before = time.time() - settings.HABITS_COMPLETION_PROCESSING_TIMEOUT
+    processing_keys = get_redis().zrangebyscore(get_processing_set_key(), '-inf', stale_before)
+    return requeue_completions(processing_keys)
+
+
+def get_period_date(habit, completed_at):
+    """
+    Возвращает дату начала периода привычки, в который попадает время выполнения.
+    Периоды отсчитываются от даты time_to_perform с шагом periodicity дней (0 - ежедневно, как и для напоминаний)
+    в часовом поясе проекта.
+    """
+
+    periodicity = habit.periodicity or 1
+    start = timezone.localtime(habit.time_to_perform).date()
+    days = (timezone.localtime(completed_at).date() - start).days
+    return start + timedelta(days=days // periodicity * periodicity)
+
+
+def enqueue_completion(habit, source, completed_at=None):
+    """
+    Добавляет отметку о выполнении привычки в буфер redis без обращения к базе.
+    Возвращает дату начала периода и длину буфера после добавления, 0 - привычка за этот период уже отмечена.
+    """
+
+    completed_at = completed_at or timezone.now()
+    period_date = get_period_date(habit, completed_at)
+    item = orjson.dumps({'habit': habit.pk, 'date': period_date.isoformat(),
+                         'completed_at': completed_at.isoformat(), 'source': source})
+    # Ключ повторной отметки хранится до конца периода с запасом в сутки.
+    expire = ((habit.periodicity or 1) + 1) * 24 * 60 * 60
+    length = get_redis().eval(ENQUEUE_SCRIPT, 2, f'{COMPLETION_KEY_PREFIX}:{habit.pk}:{period_date}',
+                              COMPLETIONS_KEY, item, expire)
+    return period_date, length
+
+
+def flush_completions(batch_size):
+    """
+    Записывает в базу одним bulk_create не больше batch_size отметок из буфера, учитывает их в статистике привычек
+    и возвращает количество отметок. Отметки удаленных привычек пропускаются, уже записанные за период -
+    игнорируются уникальным индексом. При ошибке базы отметки возвращаются в буфер, при падении воркера
+    их возвращает recover_completions.
+    """
+
+    processing_key = f'{COMPLETIONS_KEY}:processing:{uuid.uuid4().hex}'
+    items = get_redis().eval(DRAIN_SCRIPT, 3, COMPLETIONS_KEY, processing_key, get_processing_set_key(), batch_size,
+                             time.time())
+    if not items:
+        return 0
+
+    completions = [orjson.loads(item) for item in items]
+    try:
+        with transaction.atomic():
+            periodicities = dict(Habit.objects.filter(
+                pk__in={completion['habit'] for completion in completions}).values_list('pk', 'periodicity'))
+            objs = [HabitCompletion(habit_id=completion['habit'], date=date.fromisoformat(completion['date']),
+                                    completed_at=datetime.fromisoformat(completion['completed_at']),
+                                    source=completion['source'])
+                    for completion in completions if completion['habit'] in periodicities]
+            HabitCompletion.objects.bulk_create(objs, ignore_conflicts=True)
+            if objs:
+                update_stats([(obj.habit_id, obj.date) for obj in objs], periodicities)
+    except DatabaseError:
+        requeue_completions([processing_key])
+        raise
+    # Транзакция зафиксирована. Повторная запись отметок, если воркер упадет до удаления списка, ничего не изменит.
+    get_redis().pipeline().delete(processing_key).zrem(get_processing_set_key(), processing_key).execute()
+    return len(items)
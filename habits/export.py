@@ -0,0 +1,56 @@
+import csv
+
+import orjson
+from django.utils import timezone
+
+from config import settings
+
+# Поля выгрузки привычек. Место и действие выгружаются названиями, в том же формате их принимает import_habits.
+EXPORT_FIELDS = ('id', 'owner', 'place', 'action', 'time_to_perform', 'is_pleasure', 'pleasure_habit', 'periodicity',
+                 'reward', 'execution_time', 'is_public')
+
+
+class Echo:
+    """ Буфер для csv.writer, возвращающий записанную строку вместо ее сохранения. """
+
+    def write(self, value):
+        return value
+
+
+def get_export_rows(queryset):
+    """
+    Возвращает строки выгрузки привычек. Привычки читаются серверным курсором пачками по HABITS_EXPORT_CHUNK_SIZE
+    вместе с местами и действиями, поэтому расход памяти не зависит от количества привычек.
+    """
+
+    queryset = queryset.select_related('place', 'action').order_by('pk')
+    for habit in queryset.iterator(chunk_size=settings.HABITS_EXPORT_CHUNK_SIZE):
+        yield {
+            'id': habit.pk,
+            'owner': habit.owner_id,
+            'place': habit.place.name,
+            'action': habit.action.name,
+            'time_to_perform': timezone.localtime(habit.time_to_perform).isoformat(),
+            'is_pleasure': habit.is_pleasure,
+            'pleasure_habit': habit.pleasure_habit_id,
+            'periodicity': habit.periodicity,
+            'reward': habit.reward,
+            'execution_time': habit.execution_time,
+            'is_public': habit.is_public,
+        }
+
+
+def stream_ndjson(rows):
+    """ Возвращает строки выгрузки в формате NDJSON: один JSON-объект на строку. """
+
+    for row in rows:
+        yield orjson.dumps(row) + b'\n'
+
+
+def stream_csv(rows):
+    """ Возвращает строки выгрузки в формате CSV, заголовок отдается до первого запроса к базе. """
+
+    writer = csv.DictWriter(Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
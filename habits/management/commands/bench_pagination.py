@@ -0,0 +1,90 @@
+import statistics
+import time
+from urllib.parse import urlparse, parse_qs
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from habits.models import Place, Action, Habit
+from habits.paginators import HabitCursorPaginator
+from habits.views import HabitPublicListAPIView
+from users.models import User
+
+URL = '/habits/public/'
+
+
+class UncachedHabitPublicListAPIView(HabitPublicListAPIView):
+    """
+    Лента публичных привычек без кэша страниц: замеряется запрос к базе, а страницы тестовых привычек
+    не попадают в общий кэш и не учитываются в статистике попаданий.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return super(HabitPublicListAPIView, self).list(request, *args, **kwargs)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время получения страниц ленты публичных привычек разной глубины '
+            'при постраничной пагинации и пагинации по курсору. Тестовые данные удаляются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--habits', type=int, default=100000, help='Количество публичных привычек')
+        parser.add_argument('--page-size', type=int, default=30, help='Размер страницы')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество замеров каждой страницы')
+
+    def handle(self, *args, **options):
+        self.page_size = options['page_size']
+        self.repeat = options['repeat']
+        self.view = UncachedHabitPublicListAPIView.as_view()
+        self.factory = APIRequestFactory(SERVER_NAME='localhost')
+
+        with transaction.atomic():
+            self.user = User.objects.create(email='bench_pagination@example.com')
+            self.seed(options['habits'])
+            count = Habit.objects.filter(is_public=True).count()
+            pks = Habit.objects.filter(is_public=True).order_by('pk').values_list('pk', flat=True)
+
+            self.stdout.write(f'{"страница":>10} {"page, мс":>10} {"cursor, мс":>11}')
+            for fraction in (0, 0.25, 0.5, 0.75, 0.99):
+                offset = int(count * fraction) // self.page_size * self.page_size
+                page_time = self.measure({'page': offset // self.page_size + 1, 'page_size': self.page_size})
+                cursor_params = {'pagination': 'cursor', 'page_size': self.page_size}
+                if offset:
+                    cursor_params['cursor'] = self.get_cursor(pks[offset - 1])
+                cursor_time = self.measure(cursor_params)
+                self.stdout.write(f'{offset // self.page_size + 1:>10} {page_time:>10.2f} {cursor_time:>11.2f}')
+
+            transaction.set_rollback(True)
+
+    def seed(self, total):
+        """ Создает публичные привычки пачками. """
+
+        place = Place.objects.create(name='bench_place')
+        action = Action.objects.create(name='bench_action')
+        for start in range(0, total, 10000):
+            Habit.objects.bulk_create(
+                Habit(owner=self.user, place=place, action=action, reward='bench', is_public=True)
+                for _ in range(min(10000, total - start)))
+
+    def get_cursor(self, position):
+        """ Возвращает курсор страницы, начинающейся после привычки с указанным первичным ключом. """
+
+        paginator = HabitCursorPaginator()
+        paginator.base_url = URL
+        url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+        return parse_qs(urlparse(url).query)['cursor'][0]
+
+    def measure(self, params):
+        """ Возвращает медианное время ответа на запрос страницы в миллисекундах. """
+
+        timings = []
+        for _ in range(self.repeat):
+            request = self.factory.get(URL, params)
+            force_authenticate(request, user=self.user)
+            started = time.perf_counter()
+            response = self.view(request)
+            response.render()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,65 @@
+import io
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from habits.models import Place, Action, Habit
+from habits.parsers import ORJSONParser, MessagePackParser
+from habits.renderers import ORJSONRenderer, MessagePackRenderer
+from habits.serializers import HabitSerializer
+from users.models import User
+
+FORMATS = (
+    ('json', JSONRenderer, JSONParser),
+    ('orjson', ORJSONRenderer, ORJSONParser),
+    ('msgpack', MessagePackRenderer, MessagePackParser),
+)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время кодирования и разбора страниц привычек разного размера стандартным JSON, orjson '
+            'и MessagePack. Тестовые данные удаляются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[30, 1000], help='Размеры страниц')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров каждого формата')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        max_size = max(options['page_sizes'])
+
+        with transaction.atomic():
+            user = User.objects.create(email='bench_renderers@example.com')
+            place = Place.objects.create(name='bench_place')
+            action = Action.objects.create(name='bench_action')
+            Habit.objects.bulk_create(
+                Habit(owner=user, place=place, action=action, reward='вознаграждение', is_public=True)
+                for _ in range(max_size))
+            habits = list(Habit.objects.filter(owner=user))
+
+            self.stdout.write(f'{"строк":>6} {"формат":>8} {"байт":>9} {"кодирование, мс":>16} {"разбор, мс":>11}')
+            for page_size in options['page_sizes']:
+                data = {'count': page_size, 'next': None, 'previous': None,
+                        'results': HabitSerializer(habits[:page_size], many=True).data}
+                for name, renderer_class, parser_class in FORMATS:
+                    renderer, parser = renderer_class(), parser_class()
+                    content = renderer.render(data)
+                    encode = self.measure(lambda: renderer.render(data))
+                    decode = self.measure(lambda: parser.parse(io.BytesIO(content), parser.media_type))
+                    self.stdout.write(f'{page_size:>6} {name:>8} {len(content):>9} {encode:>16.3f} {decode:>11.3f}')
+
+            transaction.set_rollback(True)
+
+    def measure(self, func):
+        """ Возвращает медианное время выполнения функции в миллисекундах. """
+
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from habits.mixins import ValuesRepresentation
+from habits.models import Place, Action, Habit
+from habits.serializers import HabitSerializer
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость формирования списка привычек сериализатором HabitSerializer '
+            'и через queryset.values() с ValuesRepresentation. Тестовые данные удаляются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--habits', type=int, default=10000, help='Количество привычек')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество замеров каждого способа')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+
+        with transaction.atomic():
+            user = User.objects.create(email='bench_serialization@example.com')
+            place = Place.objects.create(name='bench_place')
+            action = Action.objects.create(name='bench_action')
+            for start in range(0, options['habits'], 10000):
+                Habit.objects.bulk_create(
+                    Habit(owner=user, place=place, action=action, reward='bench', is_public=True)
+                    for _ in range(min(10000, options['habits'] - start)))
+            queryset = Habit.objects.filter(owner=user)
+
+            serializer = HabitSerializer(many=True)
+            representation = ValuesRepresentation.build(serializer.child)
+
+            def serialize():
+                return HabitSerializer(queryset, many=True).data
+
+            def serialize_values():
+                return [representation.to_representation(row) for row in queryset.values(*representation.columns)]
+
+            if JSONRenderer().render(serialize()) != JSONRenderer().render(serialize_values()):
+                raise CommandError('Ответы сериализатора и ValuesRepresentation различаются')
+
+            count = queryset.count()
+            self.stdout.write(f'{"способ":>12} {"строк":>8} {"мс":>10} {"строк/с":>10}')
+            for name, func in (('serializer', serialize), ('values', serialize_values)):
+                elapsed = self.measure(func)
+                self.stdout.write(f'{name:>12} {count:>8} {elapsed * 1000:>10.1f} {count / elapsed:>10.0f}')
+
+            transaction.set_rollback(True)
+
+    def measure(self, func):
+        """ Возвращает медианное время выполнения функции в секундах. """
+
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+import orjson
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework import serializers
+
+from habits.cache import bump_public_feed_version
+from habits.models import Place, Action, Habit, ScheduleOutbox
+from habits.serializers import HabitSerializer, get_related_objects
+from habits.tasks import enqueue_schedule_changes
+from users.models import User
+
+# Поле time_to_perform модели заполняется при создании и только читается HabitSerializer,
+# поэтому значение из файла разбирается отдельно и записывается после создания привычек.
+TIME_TO_PERFORM_FIELD = serializers.DateTimeField()
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает привычки из файла NDJSON или CSV в формате выгрузки /habits/export/ пачками: '
+            'места и действия задаются названиями и создаются при отсутствии, привычки проверяются правилами '
+            'HabitSerializer и создаются через bulk_create вместе с расписанием, время выполнения time_to_perform '
+            'берется из файла или, если не задано, равно времени загрузки. После каждой пачки сохраняется '
+            'контрольная точка, с которой загрузка продолжается после сбоя.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу NDJSON (.ndjson, .jsonl) или CSV (.csv)')
+        parser.add_argument('--input-format', choices=('ndjson', 'csv'),
+                            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--owner', help='Email пользователя, которому назначаются все привычки файла')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество строк в одной пачке')
+        parser.add_argument('--checkpoint', help='Файл контрольной точки, по умолчанию <path>.checkpoint')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать загрузку сначала, игнорируя контрольную точку')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['input_format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        self.checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        self.owner = None
+        if options['owner']:
+            self.owner = User.objects.filter(email=options['owner']).first()
+            if self.owner is None:
+                raise CommandError(f'Пользователь {options["owner"]} не найден')
+
+        checkpoint = {'line': 0, 'imported': 0, 'errors': 0}
+        if not options['restart'] and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as file:
+                checkpoint = json.load(file)
+            self.stdout.write(f'Продолжение загрузки после строки {checkpoint["line"]}')
+
+        self.places = self.get_names(Place)
+        self.actions = self.get_names(Action)
+        started = time.monotonic()
+        imported = errors = 0
+
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = enumerate(self.read_rows(file, input_format), start=1)
+            rows = ((line, row) for line, row in rows if line > checkpoint['line'])
+            while batch := list(islice(rows, options['batch_size'])):
+                batch_imported, batch_errors = self.import_batch(batch)
+                imported += batch_imported
+                errors += batch_errors
+                checkpoint = {'line': batch[-1][0], 'imported': checkpoint['imported'] + batch_imported,
+                              'errors': checkpoint['errors'] + batch_errors}
+                self.save_checkpoint(checkpoint)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Строка {checkpoint["line"]}: загружено {checkpoint["imported"]}')
+
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'Загружено привычек: {imported}, строк с ошибками: {errors}')
+        self.stdout.write(f'Время: {elapsed:.1f} с, {imported / elapsed if elapsed else 0:.0f} привычек/с')
+
+    def read_rows(self, file, input_format):
+        """ Читает строки файла по одной. Строки NDJSON разбираются при загрузке пачки в parse_row. """
+
+        if input_format == 'csv':
+            yield from csv.DictReader(file)
+            return
+        for line in file:
+            if line.strip():
+                yield line
+
+    def parse_row(self, row):
+        """ Разбирает строку NDJSON и проверяет, что она является объектом с названиями места и действия. """
+
+        if isinstance(row, str):
+            row = orjson.loads(row)
+        if not isinstance(row, dict):
+            raise ValueError('строка должна быть объектом')
+        for field in ('place', 'action'):
+            if not isinstance(row.get(field), (str, type(None))):
+                raise ValueError(f'{field}: название должно быть строкой')
+        return row
+
+    def get_names(self, model):
+        """ Возвращает словарь идентификаторов справочника по названиям, для повторяющихся названий - первый. """
+
+        names = {}
+        for pk, name in model.objects.order_by('pk').values_list('pk', 'name'):
+            names.setdefault(name, pk)
+        return names
+
+    def resolve_names(self, model, names, batch_names):
+        """ Создает отсутствующие в справочнике записи одним запросом и добавляет их в словарь. """
+
+        missing = {name for name in batch_names if name and name not in names}
+        for obj in model.objects.bulk_create(model(name=name) for name in sorted(missing)):
+            names[obj.name] = obj.pk
+
+    def prepare_row(self, row):
+        """ Приводит строку файла к данным HabitSerializer: пустые значения убираются, названия заменяются на ключи. """
+
+        data = {key: value for key, value in row.items() if value not in ('', None)}
+        for field, names in (('place', self.places), ('action', self.actions)):
+            if field in data:
+                data[field] = names[data[field]]
+        if self.owner is not None:
+            data['owner'] = self.owner.pk
+        return data
+
+    def import_batch(self, batch):
+        """
+        Проверяет и создает привычки пачки в одной транзакции вместе с записями outbox для их расписания.
+        Строки, которые не удалось разобрать, учитываются как ошибки и не прерывают загрузку.
+        Время выполнения из файла записывается после bulk_create, который заполняет его временем создания.
+        Возвращает количество созданных привычек и строк с ошибками.
+        """
+
+        habits, parsed = [], []
+        errors = 0
+        for line, row in batch:
+            try:
+                parsed.append((line, self.parse_row(row)))
+            except ValueError as error:
+                errors += 1
+                self.stderr.write(f'Строка {line}: {error}')
+
+        with transaction.atomic():
+            self.resolve_names(Place, self.places, {row.get('place') for _, row in parsed})
+            self.resolve_names(Action, self.actions, {row.get('action') for _, row in parsed})
+            rows = [(line, self.prepare_row(row)) for line, row in parsed]
+            context = {'related_objects': get_related_objects(HabitSerializer(), [data for _, data in rows])}
+            times = {}
+            for line, data in rows:
+                serializer = HabitSerializer(data=data, context=context)
+                try:
+                    serializer.is_valid(raise_exception=True)
+                    if 'time_to_perform' in data:
+                        times[len(habits)] = TIME_TO_PERFORM_FIELD.run_validation(data['time_to_perform'])
+                except serializers.ValidationError as error:
+                    errors += 1
+                    self.stderr.write(f'Строка {line}: {error.detail}')
+                    continue
+                habits.append(Habit(**serializer.validated_data))
+
+            Habit.objects.bulk_create(habits)
+            if times:
+                for index, time_to_perform in times.items():
+                    habits[index].time_to_perform = time_to_perform
+                Habit.objects.bulk_update([habits[index] for index in times], ['time_to_perform'])
+            if habits:
+                enqueue_schedule_changes([habit.pk for habit in habits], ScheduleOutbox.SET)
+            if any(habit.is_public for habit in habits):
+                transaction.on_commit(bump_public_feed_version)
+        return len(habits), errors
+
+    def save_checkpoint(self, checkpoint):
+        """ Атомарно сохраняет контрольную точку после фиксации пачки. """
+
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(tmp_path, self.checkpoint_path)
@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from habits.models import Habit
+from habits.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает статистику выполнения привычек (серии и долю выполненных периодов) по всем отметкам '
+            'о выполнении. Привычки обрабатываются пачками, каждая пачка - в отдельной транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Количество привычек в одной пачке')
+
+    def handle(self, *args, **options):
+        last_pk = 0
+        rebuilt = 0
+        while True:
+            habits = list(Habit.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'periodicity')[
+                          :options['chunk_size']])
+            if not habits:
+                break
+            with transaction.atomic():
+                rebuild_stats(habits)
+            last_pk = habits[-1].pk
+            rebuilt += len(habits)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Пересчитана статистика {rebuilt} привычек')
+
+        self.stdout.write(f'Пересчитана статистика привычек: {rebuilt}')
@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from habits.models import Habit
+from habits.services import recompute_next_due_at, SCHEDULE_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает время следующего напоминания для всех привычек пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Количество привычек в одной пачке')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        now = timezone.now()
+        last_pk = 0
+        total = 0
+
+        while True:
+            habits = list(Habit.objects.filter(pk__gt=last_pk).order_by('pk').only(*SCHEDULE_FIELDS)[:chunk_size])
+            if not habits:
+                break
+            recompute_next_due_at(habits, now)
+            last_pk = habits[-1].pk
+            total += len(habits)
+            self.stdout.write(f'Обработано привычек: {total}')
+
+        self.stdout.write(f'Время следующего напоминания пересчитано для {total} привычек.')
@@ -0,0 +1,224 @@
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask, PeriodicTasks, IntervalSchedule
+
+from config import settings
+from habits.models import Habit
+from habits.services import get_next_due_at, get_periodic_task_kwargs, get_redis, SCHEDULE_FIELDS, SCHEDULE_KEY, \
+    REMINDER_TASK
+
+REMINDER_TASKS = (REMINDER_TASK, 'habits.tasks.send_telegram_message')
+
+
+class Command(BaseCommand):
+    help = ('Сверяет расписание напоминаний с привычками пачками: создает недостающие записи, '
+            'исправляет несовпадающие и удаляет лишние.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Количество привычек в одной пачке')
+        parser.add_argument('--dry-run', action='store_true', help='Только подсчитать расхождения без исправления')
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        self.dry_run = options['dry_run']
+        self.stats = Counter()
+        self.intervals = {}
+        started = time.monotonic()
+        now = timezone.now()
+
+        for habits in self.iter_habits():
+            self.sync_next_due_at(habits, now)
+            if settings.HABITS_SCHEDULER == 'redis':
+                self.sync_redis_schedule(habits)
+            elif settings.HABITS_SCHEDULER != 'dispatcher':
+                self.sync_periodic_tasks(habits)
+            self.stats['habits'] += len(habits)
+
+        if settings.HABITS_SCHEDULER == 'redis':
+            self.delete_orphan_redis_entries()
+        if settings.HABITS_SCHEDULER in ('dispatcher', 'redis'):
+            changed = self.delete_reminder_periodic_tasks()
+        else:
+            self.delete_orphan_periodic_tasks()
+            changed = True
+        if changed and not self.dry_run:
+            PeriodicTasks.update_changed()
+
+        elapsed = time.monotonic() - started
+        self.report(elapsed)
+
+    def iter_habits(self):
+        """ Перебирает привычки пачками по возрастанию первичного ключа. """
+
+        last_pk = 0
+        while True:
+            habits = list(Habit.objects.filter(pk__gt=last_pk).order_by('pk').only(*SCHEDULE_FIELDS)[:self.chunk_size])
+            if not habits:
+                return
+            yield habits
+            last_pk = habits[-1].pk
+
+    def sync_next_due_at(self, habits, now):
+        """ Исправляет время следующего напоминания, не соответствующее времени суток и периодичности привычки. """
+
+        changed = []
+        for habit in habits:
+            if habit.next_due_at is not None:
+                expected = get_next_due_at(habit, habit.next_due_at - timedelta(microseconds=1))
+                if expected == habit.next_due_at:
+                    continue
+                if expected is not None:
+                    expected = get_next_due_at(habit, now)
+            else:
+                expected = get_next_due_at(habit, now)
+                if expected is None:
+                    continue
+            self.count('next_due_at', habit.next_due_at, expected)
+            habit.next_due_at = expected
+            changed.append(habit)
+
+        if changed and not self.dry_run:
+            Habit.objects.bulk_update(changed, ['next_due_at'])
+
+    def get_interval(self, every):
+        """ Возвращает интервал периодической задачи, не создавая его в режиме проверки. """
+
+        if every not in self.intervals:
+            interval = IntervalSchedule.objects.filter(every=every, period=IntervalSchedule.MINUTES).first()
+            if interval is None:
+                interval = IntervalSchedule(every=every, period=IntervalSchedule.MINUTES)
+                if not self.dry_run:
+                    interval.save()
+            self.intervals[every] = interval
+        return self.intervals[every]
+
+    def sync_periodic_tasks(self, habits):
+        """ Сверяет периодические задачи с пачкой привычек. """
+
+        habits_by_name = {str(habit.pk): habit for habit in habits}
+        tasks = {task.name: task for task in PeriodicTask.objects.filter(name__in=habits_by_name)}
+        to_create, to_update, to_delete = [], [], []
+
+        for name, habit in habits_by_name.items():
+            task = tasks.get(name)
+            if habit.next_due_at is None:
+                if task is not None:
+                    to_delete.append(task.pk)
+                continue
+            interval = self.get_interval(habit.periodicity)
+            kwargs = get_periodic_task_kwargs(habit.pk)
+            if task is None:
+                to_create.append(PeriodicTask(interval=interval, name=name, task=REMINDER_TASK, kwargs=kwargs))
+            elif (task.interval_id, task.task, task.kwargs) != (interval.pk, REMINDER_TASK, kwargs):
+                task.interval, task.task, task.kwargs = interval, REMINDER_TASK, kwargs
+                to_update.append(task)
+
+        self.stats['periodic_task_created'] += len(to_create)
+        self.stats['periodic_task_updated'] += len(to_update)
+        self.stats['periodic_task_deleted'] += len(to_delete)
+        if not self.dry_run:
+            PeriodicTask.objects.bulk_create(to_create)
+            PeriodicTask.objects.bulk_update(to_update, ['interval', 'task', 'kwargs'])
+            PeriodicTask.objects.filter(pk__in=to_delete).delete()
+
+    def delete_orphan_periodic_tasks(self):
+        """ Удаляет периодические задачи напоминаний об удаленных привычках. """
+
+        last_pk = 0
+        while True:
+            tasks = list(PeriodicTask.objects.filter(pk__gt=last_pk, task__in=REMINDER_TASKS).order_by('pk').values_list(
+                'pk', 'name')[:self.chunk_size])
+            if not tasks:
+                return
+            last_pk = tasks[-1][0]
+            habit_pks = {int(name) for _, name in tasks if name.isdigit()}
+            existing = set(Habit.objects.filter(pk__in=habit_pks).values_list('pk', flat=True))
+            orphans = [pk for pk, name in tasks if not name.isdigit() or int(name) not in existing]
+            self.stats['periodic_task_deleted'] += len(orphans)
+            if orphans and not self.dry_run:
+                PeriodicTask.objects.filter(pk__in=orphans).delete()
+
+    def delete_reminder_periodic_tasks(self):
+        """
+        Удаляет пачками все периодические задачи напоминаний и возвращает их количество. В режимах dispatcher и redis
+        напоминания отправляет dispatch_due_habits, поэтому задачи, оставшиеся после режима periodic_task,
+        приводили бы к повторным напоминаниям.
+        """
+
+        last_pk = deleted = 0
+        while True:
+            pks = list(PeriodicTask.objects.filter(pk__gt=last_pk, task__in=REMINDER_TASKS).order_by('pk').values_list(
+                'pk', flat=True)[:self.chunk_size])
+            if not pks:
+                return deleted
+            last_pk = pks[-1]
+            self.stats['periodic_task_deleted'] += len(pks)
+            deleted += len(pks)
+            if not self.dry_run:
+                PeriodicTask.objects.filter(pk__in=pks).delete()
+
+    def sync_redis_schedule(self, habits):
+        """ Сверяет отсортированное множество redis с пачкой привычек. """
+
+        redis_client = get_redis()
+        scores = redis_client.zmscore(SCHEDULE_KEY, [habit.pk for habit in habits])
+        pipeline = redis_client.pipeline(transaction=False)
+
+        for habit, score in zip(habits, scores):
+            expected = habit.next_due_at.timestamp() if habit.next_due_at is not None else None
+            if score == expected:
+                continue
+            self.count('redis', score, expected)
+            if expected is None:
+                pipeline.zrem(SCHEDULE_KEY, habit.pk)
+            else:
+                pipeline.zadd(SCHEDULE_KEY, {habit.pk: expected})
+
+        if not self.dry_run:
+            pipeline.execute()
+
+    def delete_orphan_redis_entries(self):
+        """ Удаляет из отсортированного множества redis напоминания об удаленных привычках. """
+
+        redis_client = get_redis()
+        members = []
+        for member, _ in redis_client.zscan_iter(SCHEDULE_KEY, count=self.chunk_size):
+            members.append(int(member))
+            if len(members) >= self.chunk_size:
+                self.delete_redis_members(members)
+                members = []
+        if members:
+            self.delete_redis_members(members)
+
+    def delete_redis_members(self, members):
+        """ Удаляет из отсортированного множества redis привычки, которых нет в базе. """
+
+        existing = set(Habit.objects.filter(pk__in=members).values_list('pk', flat=True))
+        orphans = [member for member in members if member not in existing]
+        self.stats['redis_deleted'] += len(orphans)
+        if orphans and not self.dry_run:
+            get_redis().zrem(SCHEDULE_KEY, *orphans)
+
+    def count(self, prefix, current, expected):
+        """ Учитывает расхождение как создание, изменение или удаление записи расписания. """
+
+        if current is None:
+            self.stats[f'{prefix}_created'] += 1
+        elif expected is None:
+            self.stats[f'{prefix}_deleted'] += 1
+        else:
+            self.stats[f'{prefix}_updated'] += 1
+
+    def report(self, elapsed):
+        """ Выводит количество расхождений и скорость обработки привычек. """
+
+        mode = 'Проверка без изменений' if self.dry_run else 'Синхронизация'
+        self.stdout.write(f'{mode} расписания в режиме {settings.HABITS_SCHEDULER}:')
+        for key in sorted(self.stats):
+            self.stdout.write(f'  {key}: {self.stats[key]}')
+        rate = self.stats['habits'] / elapsed if elapsed else 0
+        self.stdout.write(f'Обработано привычек: {self.stats["habits"]} за {elapsed:.2f} с ({rate:.0f} привычек/с)')
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0002_habit_next_due_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('habit_id', models.BigIntegerField(verbose_name='идентификатор привычки')),
+                ('operation', models.CharField(choices=[('set', 'создать или обновить расписание'), ('delete', 'удалить расписание')], max_length=10, verbose_name='операция')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='время создания')),
+            ],
+            options={
+                'verbose_name': 'изменение расписания',
+                'verbose_name_plural': 'изменения расписания',
+                'ordering': ('pk',),
+            },
+        ),
+    ]
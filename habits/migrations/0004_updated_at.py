@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0003_scheduleoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='время изменения'),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='время изменения'),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='время изменения'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HabitCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='дата начала периода')),
+                ('completed_at', models.DateTimeField(verbose_name='время выполнения')),
+                ('source', models.CharField(choices=[('api', 'api'), ('telegram', 'telegram')], default='api', max_length=10, verbose_name='источник отметки')),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completions', to='habits.habit', verbose_name='привычка')),
+            ],
+            options={
+                'verbose_name': 'выполнение привычки',
+                'verbose_name_plural': 'выполнения привычек',
+                'ordering': ('habit', 'date'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='habitcompletion',
+            constraint=models.UniqueConstraint(fields=('habit', 'date'), name='habit_completion_unique_period'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0005_habitcompletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HabitStats',
+            fields=[
+                ('habit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='habits.habit', verbose_name='привычка')),
+                ('current_streak', models.PositiveIntegerField(default=0, verbose_name='текущая серия выполненных периодов')),
+                ('longest_streak', models.PositiveIntegerField(default=0, verbose_name='самая длинная серия выполненных периодов')),
+                ('last_period', models.DateField(blank=True, null=True, verbose_name='дата начала последнего выполненного периода')),
+                ('streak_expires', models.DateField(blank=True, db_index=True, null=True, verbose_name='дата прерывания текущей серии')),
+                ('history', models.BigIntegerField(default=0, verbose_name='выполненные периоды за последние дни')),
+                ('history_date', models.DateField(blank=True, null=True, verbose_name='дата отсчета выполненных периодов')),
+            ],
+            options={
+                'verbose_name': 'статистика привычки',
+                'verbose_name_plural': 'статистика привычек',
+                'ordering': ('habit',),
+            },
+        ),
+    ]
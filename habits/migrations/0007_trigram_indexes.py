@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:19
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0006_habitstats'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='action',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='habits_action_name_trgm', opclasses=('gin_trgm_ops',)),
+        ),
+        migrations.AddIndex(
+            model_name='action',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['description'], name='habits_action_description_trgm', opclasses=('gin_trgm_ops',)),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='habits_place_name_trgm', opclasses=('gin_trgm_ops',)),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['description'], name='habits_place_description_trgm', opclasses=('gin_trgm_ops',)),
+        ),
+    ]
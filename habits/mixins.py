@@ -0,0 +1,394 @@
+import hashlib
+import re
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Greatest
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status, serializers
+from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.serializers import ValidationError, ListSerializer
+
+from config import settings
+
+
+class ExpandFieldsMixin:
+    """
+    Заменяет идентификаторы связанных объектов вложенными объектами для полей из контекста 'expand'.
+    Сериализаторы связанных объектов задаются в expandable_fields, 'self' означает сериализатор того же класса.
+    """
+
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.context.get('expand', ()):
+            serializer_class = self.expandable_fields[name]
+            if serializer_class == 'self':
+                serializer_class = type(self)
+            self.fields[name] = serializer_class(read_only=True)
+
+
+class ExpandViewMixin:
+    """
+    Разбирает параметр запроса expand со списком связанных объектов через запятую,
+    передает его в контекст сериализатора и загружает связанные объекты вместе с основным запросом.
+    """
+
+    expand_query_param = 'expand'
+
+    def get_expand(self):
+        if not hasattr(self, '_expand'):
+            value = self.request.query_params.get(self.expand_query_param, '')
+            expand = [name.strip() for name in value.split(',') if name.strip()]
+            unknown = set(expand) - set(self.get_serializer_class().expandable_fields)
+            if unknown:
+                raise ValidationError({self.expand_query_param: f'Нельзя раскрыть поля: {", ".join(sorted(unknown))}'})
+            self._expand = expand
+        return self._expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        model = queryset.model
+        expand = self.get_expand()
+        select = [name for name in expand if model._meta.get_field(name).many_to_one]
+        prefetch = [name for name in expand if name not in select]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class ConditionalGetMixin:
+    """
+    Добавляет к ответам на получение списка и объекта строгий ETag и Last-Modified.
+    ETag списка вычисляется по количеству объектов и максимальному времени изменения одним агрегирующим запросом,
+    поэтому при совпадении с If-None-Match ответ 304 отдается без загрузки и сериализации объектов.
+    Раскрытые через expand связанные объекты учитываются, если у их модели есть время изменения.
+    """
+
+    updated_field = 'updated_at'
+
+    def get_etag(self, *parts):
+        """ Возвращает строгий ETag по состоянию данных, пользователю, адресу и формату ответа. """
+
+        request = self.request
+        parts += (request.user.pk, request.get_full_path(), request.META.get('HTTP_ACCEPT', ''))
+        return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+    def get_expanded_updated_fields(self, model):
+        """
+        Возвращает связанные объекты из expand, у моделей которых есть время изменения,
+        или None, если состояние хотя бы одного из них отследить нельзя.
+        """
+
+        names = []
+        for name in getattr(self, 'get_expand', list)():
+            related_model = model._meta.get_field(name).related_model
+            if not any(field.name == self.updated_field for field in related_model._meta.concrete_fields):
+                return None
+            names.append(name)
+        return names
+
+    def get_conditional_headers(self, etag, last_modified):
+        headers = {'ETag': etag}
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(last_modified.timestamp())
+        return headers
+
+    def is_not_modified(self, etag, last_modified=None):
+        """ Проверяет заголовки If-None-Match и If-Modified-Since запроса. """
+
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags or f'W/{etag}' in etags
+        if_modified_since = parse_http_date_safe(self.request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return (if_modified_since is not None and last_modified is not None
+                and int(last_modified.timestamp()) <= if_modified_since)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Отдает 304, если список не изменился. Last-Modified списка не учитывает удаление объектов,
+        поэтому для списков проверяется только If-None-Match.
+        """
+
+        queryset = self.filter_queryset(self.get_queryset())
+        expanded = self.get_expanded_updated_fields(queryset.model)
+        if expanded is None:
+            return super().list(request, *args, **kwargs)
+
+        aggregates = {'count': Count('pk', distinct=bool(expanded)), 'last_modified': Max(self.updated_field)}
+        aggregates.update({name: Max(f'{name}__{self.updated_field}') for name in expanded})
+        state = queryset.order_by().aggregate(**aggregates)
+        etag = self.get_etag(*sorted(state.items()))
+        headers = self.get_conditional_headers(etag, state['last_modified'])
+        if request.META.get('HTTP_IF_NONE_MATCH') and self.is_not_modified(etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response = super().list(request, *args, **kwargs)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """ Отдает 304 без сериализации, если объект не изменился. """
+
+        instance = self.get_object()
+        expanded = self.get_expanded_updated_fields(type(instance))
+        if expanded is None:
+            return Response(self.get_serializer(instance).data)
+
+        objects = [instance, *(getattr(instance, name) for name in expanded)]
+        updated = [getattr(obj, self.updated_field) for obj in objects if obj is not None]
+        etag = self.get_etag(instance.pk, *updated)
+        last_modified = max(updated)
+        headers = self.get_conditional_headers(etag, last_modified)
+        if self.is_not_modified(etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(self.get_serializer(instance).data, headers=headers)
+
+
+class SparseFieldsViewMixin:
+    """
+    Разбирает параметры запроса fields и omit со списками полей через запятую.
+    При получении данных оставляет в ответе только перечисленные в fields поля или все поля, кроме перечисленных в omit,
+    и загружает из базы только столбцы, нужные для этих полей.
+    """
+
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def get_serializer_fields(self):
+        """ Возвращает поля сериализатора, читаемые в ответе. """
+
+        if not hasattr(self, '_serializer_fields'):
+            fields = self.get_serializer_class()().fields
+            self._serializer_fields = {name: field for name, field in fields.items() if not field.write_only}
+        return self._serializer_fields
+
+    def get_sparse_fields(self):
+        """ Возвращает имена полей ответа или None, если fields и omit не переданы или запрос не на чтение. """
+
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = None
+            names = {}
+            for param in (self.fields_query_param, self.omit_query_param):
+                value = self.request.query_params.get(param, '')
+                names[param] = [name.strip() for name in value.split(',') if name.strip()]
+            if self.request.method in SAFE_METHODS and any(names.values()):
+                readable = list(self.get_serializer_fields())
+                for param, param_names in names.items():
+                    unknown = set(param_names) - set(readable)
+                    if unknown:
+                        raise ValidationError({param: f'Неизвестные поля: {", ".join(sorted(unknown))}'})
+                selected = names[self.fields_query_param] or readable
+                self._sparse_fields = [name for name in readable
+                                       if name in selected and name not in names[self.omit_query_param]]
+        return self._sparse_fields
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        sparse_fields = self.get_sparse_fields()
+        if sparse_fields is not None:
+            target = serializer.child if isinstance(serializer, ListSerializer) else serializer
+            for name in list(target.fields):
+                if name not in sparse_fields:
+                    target.fields.pop(name)
+        return serializer
+
+    def get_only_fields(self, model, sparse_fields):
+        """
+        Возвращает поля модели, нужные для полей ответа,
+        или None, если какое-то поле ответа не соответствует столбцу модели.
+        """
+
+        serializer_fields = self.get_serializer_fields()
+        only = [model._meta.pk.name]
+        for name in sparse_fields:
+            source = serializer_fields[name].source
+            if source == 'pk':
+                continue
+            try:
+                field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.many_to_many:
+                return None
+            only.append(field.name)
+        return only
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        sparse_fields = self.get_sparse_fields()
+        if sparse_fields is None:
+            return queryset
+        only = self.get_only_fields(queryset.model, sparse_fields)
+        if only is None:
+            return queryset
+        # Связи, загружаемые через select_related, не могут быть отложены.
+        if isinstance(queryset.query.select_related, dict):
+            only.extend(queryset.query.select_related)
+        return queryset.only(*only)
+
+
+class ValuesRepresentation:
+    """
+    Представление объектов сериализатора, построенное из словарей queryset.values() без создания объектов модели
+    и обхода полей сериализатора на каждую строку. Преобразователи полей выбираются один раз при построении,
+    результат совпадает с результатом сериализатора.
+    """
+
+    # Поля, представление которых совпадает со значением из базы.
+    plain_fields = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+    def __init__(self, fields):
+        self.fields = fields
+        # Первичный ключ нужен пагинации по курсору, даже если его нет в полях ответа.
+        self.columns = list(dict.fromkeys([*(column for _, column, _ in fields), 'pk']))
+
+    @classmethod
+    def build(cls, serializer):
+        """
+        Возвращает представление для полей сериализатора модели или None, если какое-то поле
+        нельзя получить из столбца модели (вложенные сериализаторы, методы, составные источники).
+        """
+
+        model = serializer.Meta.model
+        fields = []
+        for field in serializer._readable_fields:
+            if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField,
+                                  serializers.ManyRelatedField)) or '.' in field.source or field.source == '*':
+                return None
+            if field.source == 'pk':
+                fields.append((field.field_name, 'pk', None))
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+            if isinstance(field, serializers.RelatedField):
+                if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.pk_field is not None:
+                    return None
+                convert = None
+            elif type(field) in cls.plain_fields:
+                convert = None
+            else:
+                convert = field.to_representation
+            fields.append((field.field_name, model_field.name, convert))
+        return cls(fields)
+
+    def to_representation(self, row):
+        data = {}
+        for name, column, convert in self.fields:
+            value = row[column]
+            data[name] = value if value is None or convert is None else convert(value)
+        return data
+
+
+class ValuesListMixin:
+    """
+    Быстрое получение списка: при включенной настройке HABITS_FAST_SERIALIZATION строки загружаются
+    через queryset.values() и преобразуются ValuesRepresentation без создания объектов модели и сериализатора
+    на каждую строку. Если поля сериализатора нельзя получить из столбцов модели, используется обычный путь.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not settings.HABITS_FAST_SERIALIZATION:
+            return super().list(request, *args, **kwargs)
+        representation = ValuesRepresentation.build(self.get_serializer(many=True).child)
+        if representation is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*representation.columns)
+        page = self.paginate_queryset(queryset)
+        data = [representation.to_representation(row) for row in (queryset if page is None else page)]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class TrigramSearchViewMixin:
+    """
+    Поиск по сходству для справочников по триграммным индексам pg_trgm на полях search_fields:
+    параметр search в списке, подсказки при вводе (suggest) и список похожих записей в ответе на создание.
+    """
+
+    search_fields = ('name', 'description')
+    search_query_param = 'search'
+
+    def get_similarity(self, query, fields):
+        """ Возвращает выражение наибольшего сходства запроса с полями. """
+
+        similarities = [TrigramSimilarity(field, query) for field in fields]
+        return Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+
+    def search(self, queryset, query, fields):
+        """
+        Отбирает записи, похожие на запрос или содержащие его в первом поле, и сортирует их по убыванию сходства.
+        Вхождение проверяется регулярным выражением без учета регистра (~*) по самому столбцу, а не по UPPER(...),
+        поэтому оба условия используют триграммный индекс.
+        """
+
+        condition = reduce(or_, (Q(**{f'{field}__trigram_similar': query}) for field in fields))
+        condition |= Q(**{f'{fields[0]}__iregex': re.escape(query)})
+        return queryset.filter(condition).annotate(similarity=self.get_similarity(query, fields)).order_by(
+            '-similarity', 'pk')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        query = self.request.query_params.get(self.search_query_param, '').strip()
+        if self.request.method in SAFE_METHODS and query:
+            queryset = self.search(queryset, query, self.search_fields)
+        return queryset
+
+    @action(detail=False)
+    def suggest(self, request):
+        """
+        Подсказки при вводе: возвращает не больше limit (по умолчанию HABITS_SEARCH_SUGGEST_LIMIT) записей,
+        название которых похоже на параметр q, в порядке убывания сходства.
+        """
+
+        query = request.query_params.get('q', '').strip()
+        limit = request.query_params.get('limit', str(settings.HABITS_SEARCH_SUGGEST_LIMIT))
+        if not limit.isdigit() or not 0 < int(limit) <= settings.HABITS_SEARCH_SUGGEST_MAX_LIMIT:
+            raise ValidationError({'limit': f'Допустимые значения: от 1 до {settings.HABITS_SEARCH_SUGGEST_MAX_LIMIT}'})
+        if not query:
+            return Response([])
+        suggestions = self.search(self.queryset, query, self.search_fields[:1])
+        return Response(list(suggestions.values('id', 'name', 'similarity')[:int(limit)]))
+
+    def get_similar(self, name):
+        """ Возвращает записи с названием, сходство которого с name не меньше HABITS_DUPLICATE_SIMILARITY. """
+
+        similar = self.queryset.annotate(similarity=TrigramSimilarity('name', name)).filter(
+            name__trigram_similar=name, similarity__gte=settings.HABITS_DUPLICATE_SIMILARITY).order_by(
+            '-similarity', 'pk')
+        return list(similar.values('id', 'name', 'similarity')[:settings.HABITS_SEARCH_SUGGEST_LIMIT])
+
+    def create(self, request, *args, **kwargs):
+        """
+        Создает запись, как и раньше, и, если уже есть записи с похожим названием, возвращает их вместе с ней
+        в поле similar, чтобы клиент мог предложить пользователю существующую запись.
+        """
+
+        name = request.data.get('name')
+        similar = self.get_similar(name) if isinstance(name, str) and name.strip() else []
+        response = super().create(request, *args, **kwargs)
+        if similar and response.status_code == status.HTTP_201_CREATED:
+            response.data['similar'] = similar
+        return response
+
@@ -1,3 +1,4 @@
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
 from config import settings
@@ -8,6 +9,7 @@ NULLABLE = {'null': True, 'blank': True}
 class Place(models.Model):
     name = models.CharField(max_length=150, verbose_name='название')
     description = models.TextField(**NULLABLE, verbose_name='описание')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='время изменения')
 
     def __str__(self):
         return f'{self.name}'
@@ -16,11 +18,17 @@ class Place(models.Model):
         verbose_name = 'место'
         verbose_name_plural = 'места'
         ordering = ('pk',)
+        # Триграммные индексы для поиска по сходству названия и описания (?search=, suggest).
+        indexes = (
+            GinIndex(fields=('name',), name='habits_place_name_trgm', opclasses=('gin_trgm_ops',)),
+            GinIndex(fields=('description',), name='habits_place_description_trgm', opclasses=('gin_trgm_ops',)),
+        )
 
 
 class Action(models.Model):
     name = models.CharField(max_length=150, verbose_name='название')
     description = models.TextField(**NULLABLE, verbose_name='описание')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='время изменения')
 
     def __str__(self):
         return f'{self.name}'
@@ -29,11 +37,16 @@ class Action(models.Model):
         verbose_name = 'действие'
         verbose_name_plural = 'действия'
         ordering = ('pk',)
+        # Триграммные индексы для поиска по сходству названия и описания (?search=, suggest).
+        indexes = (
+            GinIndex(fields=('name',), name='habits_action_name_trgm', opclasses=('gin_trgm_ops',)),
+            GinIndex(fields=('description',), name='habits_action_description_trgm', opclasses=('gin_trgm_ops',)),
+        )
 
 
 class Habit(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, **NULLABLE, related_name='habit',
-                              verbose_name='создатель')
+                              db_index=False, verbose_name='создатель')
     place = models.ForeignKey(Place, on_delete=models.PROTECT, related_name='habit', verbose_name='место')
     time_to_perform = models.DateTimeField(auto_now_add=True, verbose_name='время и дата, когда необходимо выполнять')
     action = models.ForeignKey(Action, on_delete=models.PROTECT, related_name='habit', verbose_name='действие')
@@ -43,13 +56,95 @@ class Habit(models.Model):
     reward = models.CharField(max_length=150, **NULLABLE, verbose_name='вознаграждение')
     execution_time = models.PositiveSmallIntegerField(default=60, verbose_name='время на выполнение в секундах')
     is_public = models.BooleanField(default=False, verbose_name='признак публичности')
+    next_due_at = models.DateTimeField(**NULLABLE, db_index=True, verbose_name='время следующего напоминания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='время изменения')
+
+    # Значение признака публичности при загрузке из базы, None для новых объектов или если поле не загружено.
+    loaded_is_public = None
 
     def __str__(self):
         return f'{self.action}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_is_public = instance.__dict__.get('is_public')
+        return instance
+
     class Meta:
         verbose_name = 'привычка'
         verbose_name_plural = 'привычки'
         ordering = ('pk',)
+        indexes = (
+            # Привычки пользователя по порядку (HabitListAPIView, статистика, выгрузка), заменяет индекс owner_id.
+            models.Index(fields=('owner', 'id'), name='habits_habit_owner_id_idx'),
+            # Лента публичных привычек по порядку (HabitPublicListAPIView).
+            models.Index(fields=('id',), condition=models.Q(is_public=True), name='habits_habit_public_id_idx'),
+        )
+
+
+class ScheduleOutbox(models.Model):
+    SET = 'set'
+    DELETE = 'delete'
+    OPERATIONS = (
+        (SET, 'создать или обновить расписание'),
+        (DELETE, 'удалить расписание'),
+    )
+
+    habit_id = models.BigIntegerField(verbose_name='идентификатор привычки')
+    operation = models.CharField(max_length=10, choices=OPERATIONS, verbose_name='операция')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='время создания')
+
+    def __str__(self):
+        return f'{self.operation} {self.habit_id}'
+
+    class Meta:
+        verbose_name = 'изменение расписания'
+        verbose_name_plural = 'изменения расписания'
+        ordering = ('pk',)
+
 
+class HabitCompletion(models.Model):
+    API = 'api'
+    TELEGRAM = 'telegram'
+    SOURCES = (
+        (API, 'api'),
+        (TELEGRAM, 'telegram'),
+    )
 
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name='completions', verbose_name='привычка')
+    date = models.DateField(verbose_name='дата начала периода')
+    completed_at = models.DateTimeField(verbose_name='время выполнения')
+    source = models.CharField(max_length=10, choices=SOURCES, default=API, verbose_name='источник отметки')
+
+    def __str__(self):
+        return f'{self.habit_id} {self.date}'
+
+    class Meta:
+        verbose_name = 'выполнение привычки'
+        verbose_name_plural = 'выполнения привычек'
+        ordering = ('habit', 'date',)
+        # Одна отметка на привычку за период, уникальный индекс (habit, date) используется и для чтения отметок.
+        constraints = (
+            models.UniqueConstraint(fields=('habit', 'date'), name='habit_completion_unique_period'),
+        )
+
+
+class HabitStats(models.Model):
+    habit = models.OneToOneField(Habit, on_delete=models.CASCADE, primary_key=True, related_name='stats',
+                                 verbose_name='привычка')
+    current_streak = models.PositiveIntegerField(default=0, verbose_name='текущая серия выполненных периодов')
+    longest_streak = models.PositiveIntegerField(default=0, verbose_name='самая длинная серия выполненных периодов')
+    last_period = models.DateField(**NULLABLE, verbose_name='дата начала последнего выполненного периода')
+    streak_expires = models.DateField(**NULLABLE, db_index=True, verbose_name='дата прерывания текущей серии')
+    # Битовая маска выполненных периодов за последние дни: бит i - период, начавшийся за i дней до history_date.
+    history = models.BigIntegerField(default=0, verbose_name='выполненные периоды за последние дни')
+    history_date = models.DateField(**NULLABLE, verbose_name='дата отсчета выполненных периодов')
+
+    def __str__(self):
+        return f'{self.habit_id}'
+
+    class Meta:
+        verbose_name = 'статистика привычки'
+        verbose_name_plural = 'статистика привычек'
+        ordering = ('habit',)
@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 
 
 class PlacePaginator(PageNumberPagination):
@@ -13,7 +13,50 @@ class ActionPaginator(PageNumberPagination):
     max_page_size = 30
 
 
+class HabitCursorPaginator(CursorPagination):
+    """ Пагинация по курсору без подсчета количества и смещения, время получения страницы не зависит от глубины. """
+
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 30
+    ordering = 'pk'
+
+
 class HabitPaginator(PageNumberPagination):
+    """
+    Постраничная пагинация привычек. При указании в запросе параметра pagination=cursor
+    или курсора страницы используется пагинация по курсору HabitCursorPaginator.
+    """
+
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 30
+    pagination_query_param = 'pagination'
+    cursor_paginator_class = HabitCursorPaginator
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        """ Проверяет, запрошена ли пагинация по курсору. """
+
+        return (request.query_params.get(self.pagination_query_param) == 'cursor'
+                or self.cursor_paginator_class.cursor_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_paginator_class()
+            page = self.cursor_paginator.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.cursor_paginator.display_page_controls
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
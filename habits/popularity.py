@@ -0,0 +1,86 @@
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from config import settings
+from habits.models import Action, Place, Habit
+
+POPULARITY_KEY = 'habits:popularity'
+POPULARITY_LOCK_KEY = 'habits:popularity:lock'
+
+# Количество дней, отметки о выполнении за которые учитываются в популярных публичных привычках.
+TRENDING_DAYS = 7
+
+# Сколько секунд и с каким интервалом запрос при пустом кэше ждет списков, пересчитываемых другим запросом.
+POPULARITY_WAIT = 2
+POPULARITY_POLL_INTERVAL = 0.1
+
+
+def get_top_catalog(model):
+    """ Возвращает действия или места, чаще всего используемые в публичных привычках, с количеством привычек. """
+
+    return list(model.objects.filter(habit__is_public=True).annotate(habits=Count('habit')).order_by(
+        '-habits', 'pk').values('id', 'name', 'habits')[:settings.HABITS_POPULARITY_TOP])
+
+
+def get_trending_habits(now):
+    """ Возвращает публичные привычки с наибольшим количеством отметок о выполнении за последние TRENDING_DAYS дней. """
+
+    since = timezone.localdate(now) - timedelta(days=TRENDING_DAYS - 1)
+    habits = Habit.objects.filter(is_public=True, completions__date__gte=since).annotate(
+        completions_count=Count('completions')).order_by('-completions_count', 'pk')
+    return [{'id': habit['id'], 'action': habit['action__name'], 'place': habit['place__name'],
+             'completions': habit['completions_count']}
+            for habit in habits.values('id', 'action__name', 'place__name', 'completions_count')[
+                         :settings.HABITS_POPULARITY_TOP]]
+
+
+def refresh_popularity():
+    """
+    Рассчитывает списки популярных действий, мест и публичных привычек запросами с группировкой
+    и сохраняет их в кэш. Запросы к таблице привычек выполняются один раз на всех пользователей.
+    """
+
+    now = timezone.now()
+    data = {
+        'generated_at': now,
+        'actions': get_top_catalog(Action),
+        'places': get_top_catalog(Place),
+        'trending': get_trending_habits(now),
+    }
+    cache.set(POPULARITY_KEY, data, timeout=None)
+    return data
+
+
+def get_popularity():
+    """
+    Возвращает рассчитанные списки популярности. Если они старше HABITS_POPULARITY_MAX_AGE секунд
+    (например, celery beat не запущен), пересчитывает их. Пересчет выполняет один запрос, остальные в это время
+    получают прежние списки, а если кэш пуст - ждут пересчета до POPULARITY_WAIT секунд и затем получают пустые списки.
+    """
+
+    data = cache.get(POPULARITY_KEY)
+    max_age = timedelta(seconds=settings.HABITS_POPULARITY_MAX_AGE)
+    if data is not None and timezone.now() - data['generated_at'] <= max_age:
+        return data
+    if not cache.add(POPULARITY_LOCK_KEY, 1, timeout=60):
+        return data if data is not None else wait_popularity()
+    try:
+        return refresh_popularity()
+    finally:
+        cache.delete(POPULARITY_LOCK_KEY)
+
+
+def wait_popularity():
+    """ Ждет списков популярности, пересчитываемых другим запросом, не выполняя пересчет. """
+
+    deadline = time.monotonic() + POPULARITY_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POPULARITY_POLL_INTERVAL)
+        data = cache.get(POPULARITY_KEY)
+        if data is not None:
+            return data
+    return {'generated_at': None, 'actions': [], 'places': [], 'trending': []}
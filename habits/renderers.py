@@ -0,0 +1,42 @@
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# Символы U+2028 и U+2029 экранируются так же, как в JSONRenderer, чтобы ответ оставался корректным javascript.
+LINE_SEPARATORS = (('\u2028'.encode(), b'\\u2028'), ('\u2029'.encode(), b'\\u2029'))
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON через orjson, ответ совпадает с JSONRenderer с настройками по умолчанию.
+    Дата и время кодируются encoder_class, как в JSONRenderer (UTC как Z, микросекунды до миллисекунд).
+    Форматированный вывод с отступами (например, для browsable API) формируется JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Нестроковые ключи словарей (например, числа) кодируются строками, как в JSONRenderer, а не вызывают TypeError.
+        ret = orjson.dumps(data, default=self.encoder_class().default,
+                           option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        for char, escaped in LINE_SEPARATORS:
+            if char in ret:
+                ret = ret.replace(char, escaped)
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """ MessagePack, выбирается заголовком Accept: application/msgpack или параметром format=msgpack. """
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONRenderer.encoder_class().default)
@@ -1,26 +1,98 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 
-from habits.models import Place, Action, Habit
+from config import settings
+from habits.mixins import ExpandFieldsMixin
+from habits.models import Place, Action, Habit, HabitCompletion
 from habits.validators import RewardValidator, TimeToCompleteValidator, PleasureHabitValidator, IsPleasureValidator, \
     PeriodicityValidator, patch_validator
+from users.serializers import OwnerSerializer
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Берет связанный объект из загруженных заранее объектов context['related_objects'] вида {модель: {pk: объект}}
+    вместо отдельного запроса к базе. Если объекты модели не загружены, работает как PrimaryKeyRelatedField.
+    """
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        objects = self.context.get('related_objects', {}).get(model)
+        if objects is None or self.pk_field is not None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = model._meta.pk.to_python(data)
+        except (TypeError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in objects:
+            self.fail('does_not_exist', pk_value=data)
+        return objects[pk]
+
+
+def get_related_objects(serializer, items):
+    """
+    Загружает связанные объекты, на которые ссылаются элементы списка данных, одним запросом на каждое поле связи
+    сериализатора. Возвращает словарь вида {модель: {pk: объект}} для PrefetchedPrimaryKeyRelatedField.
+    """
+
+    related_objects = {}
+    for name, field in serializer.fields.items():
+        if field.read_only or not isinstance(field, PrefetchedPrimaryKeyRelatedField):
+            continue
+        queryset = field.get_queryset()
+        pks = set()
+        for item in items:
+            try:
+                pks.add(queryset.model._meta.pk.to_python(item[name]))
+            except (KeyError, TypeError, DjangoValidationError):
+                continue
+        pks.discard(None)
+        objects = related_objects.setdefault(queryset.model, {})
+        objects.update(queryset.filter(pk__in=pks - objects.keys()).in_bulk())
+    return related_objects
+
+
+class PrefetchedListSerializer(serializers.ListSerializer):
+    """
+    Валидирует список объектов, загружая связанные объекты всех элементов заранее одним запросом на каждое поле связи,
+    после чего правила валидации применяются к каждому элементу без запросов к базе.
+    Количество запросов не зависит от размера списка.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and 'related_objects' not in self._context:
+            items = [item for item in data if isinstance(item, dict)]
+            self._context['related_objects'] = get_related_objects(self.child, items)
+        return super().to_internal_value(data)
 
 
 class PlaceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Place
-        fields = '__all__'
+        exclude = ('updated_at',)
 
 
 class ActionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Action
-        fields = '__all__'
+        exclude = ('updated_at',)
 
 
-class HabitSerializer(serializers.ModelSerializer):
+class HabitSerializer(ExpandFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+    expandable_fields = {
+        'owner': OwnerSerializer,
+        'place': PlaceSerializer,
+        'action': ActionSerializer,
+        'pleasure_habit': 'self',
+    }
+
     class Meta:
         model = Habit
-        fields = '__all__'
+        exclude = ('next_due_at', 'updated_at')
+        list_serializer_class = PrefetchedListSerializer
         validators = [
             RewardValidator(fields_list=['pleasure_habit', 'reward']),
             TimeToCompleteValidator(field='execution_time'),
@@ -34,3 +106,39 @@ class HabitSerializer(serializers.ModelSerializer):
 
         patch_validator(instance, validated_data)
         return super().update(instance, validated_data)
+
+
+class HabitCompletionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HabitCompletion
+        fields = ('id', 'habit', 'date', 'completed_at', 'source')
+
+
+class HabitOperationSerializer(serializers.Serializer):
+    """ Операция пакетного изменения привычек: создание, изменение или удаление одной привычки. """
+
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+    op = serializers.ChoiceField(choices=(CREATE, UPDATE, DELETE))
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] != self.CREATE and 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'Обязательное поле для изменения и удаления привычки.'})
+        if attrs['op'] != self.DELETE and 'data' not in attrs:
+            raise serializers.ValidationError({'data': 'Обязательное поле для создания и изменения привычки.'})
+        return attrs
+
+
+class HabitBulkSerializer(serializers.Serializer):
+    """
+    Запрос пакетного изменения привычек. При atomic=false корректные операции выполняются,
+    а ошибки возвращаются по каждой операции отдельно.
+    """
+
+    operations = HabitOperationSerializer(many=True, allow_empty=False,
+                                          max_length=settings.HABITS_BULK_MAX_OPERATIONS)
+    atomic = serializers.BooleanField(default=True)
@@ -1,38 +1,250 @@
 import pytz
 import json
-from django_celery_beat.models import PeriodicTask, IntervalSchedule
+from datetime import datetime, timedelta
+
+import redis
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask, PeriodicTasks, IntervalSchedule
 
 from config import settings
+from habits.models import Habit
+
+
+_redis = None
+
+# Поля привычки, необходимые для вычисления времени напоминаний.
+SCHEDULE_FIELDS = ('pk', 'owner', 'time_to_perform', 'periodicity', 'is_pleasure', 'next_due_at')
+
+REMINDER_TASK = 'habits.tasks.send_habit_reminders'
+
+# Отсортированное множество redis с идентификаторами привычек, балл - время следующего напоминания (timestamp).
+SCHEDULE_KEY = 'habits:schedule'
+
+# Атомарно извлекает из множества не больше ARGV[2] привычек со временем напоминания не позже ARGV[1],
+# поэтому несколько экземпляров диспетчера не отправят одно напоминание дважды.
+POP_DUE_SCRIPT = """
+local members = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+for i = 1, #members, 2 do
+    redis.call('ZREM', KEYS[1], members[i])
+end
+return members
+"""
+
+
+def get_redis():
+    """ Возвращает общее для процесса подключение к redis. """
+
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def get_message_kwargs(habit):
+    """ Возвращает параметры напоминания о привычке для задачи отправки сообщения в telegram. """
+
+    target_timezone = pytz.timezone(settings.TIME_ZONE)
+    converted_datetime = habit.time_to_perform.astimezone(target_timezone)
+
+    return {
+        'habit_id': habit.pk,
+        'chat_id': habit.owner.telegram_chat_id,
+        'action': habit.action.name,
+        'time': str(converted_datetime.time().replace(second=0, microsecond=0)),
+        'place': habit.place.name
+    }
+
+
+def get_message_text(message):
+    """
+    Возвращает текст напоминания о привычке по параметрам из get_message_kwargs
+    или текст объединенного напоминания о нескольких привычках.
+    """
+
+    if 'reminders' in message:
+        return '\n'.join(get_message_text(reminder) for reminder in message['reminders'])
+    return f"Я буду {message['action']} в {message['time']} в {message['place']}"
+
+
+def get_reply_markup(message):
+    """
+    Возвращает параметры sendMessage с кнопкой отметки выполнения для каждой привычки напоминания.
+    Для напоминаний без идентификатора привычки (созданных до появления отметок) кнопки не добавляются.
+    """
+
+    reminders = [reminder for reminder in message.get('reminders', [message]) if 'habit_id' in reminder]
+    if not reminders:
+        return {}
+    buttons = [[{'text': f"Выполнено: {reminder['action']}" if 'reminders' in message else 'Выполнено',
+                 'callback_data': f"done:{reminder['habit_id']}"}] for reminder in reminders]
+    return {'reply_markup': {'inline_keyboard': buttons}}
+
+
+def get_messages(habits):
+    """
+    Возвращает напоминания для отправки по привычкам, владельцы которых подключили telegram.
+    Напоминания пользователя с признаком coalesce_reminders объединяются в одно сообщение.
+    """
+
+    messages = []
+    coalesced = {}
+    for habit in habits:
+        if not habit.owner or not habit.owner.telegram_chat_id:
+            continue
+        message = get_message_kwargs(habit)
+        if settings.HABITS_COALESCE_REMINDERS and habit.owner.coalesce_reminders:
+            coalesced.setdefault(message['chat_id'], []).append(message)
+        else:
+            messages.append(message)
+
+    for chat_id, chat_messages in coalesced.items():
+        if len(chat_messages) == 1:
+            messages.append(chat_messages[0])
+        else:
+            messages.append({'chat_id': chat_id, 'reminders': chat_messages})
+    return messages
+
+
+def get_next_due_at(habit, after):
+    """
+    Вычисляет ближайшее после after время напоминания о полезной привычке
+    по времени суток выполнения, периодичности в днях и часовому поясу проекта.
+    Для приятных привычек и привычек без создателя напоминания не отправляются.
+    """
+
+    if habit.is_pleasure or habit.owner_id is None:
+        return None
+
+    target_timezone = pytz.timezone(settings.TIME_ZONE)
+    start = habit.time_to_perform.astimezone(target_timezone)
+    periodicity = habit.periodicity or 1
+
+    days_passed = max((after.astimezone(target_timezone).date() - start.date()).days, 0)
+    day = start.date() + timedelta(days=days_passed - days_passed % periodicity)
+    while True:
+        due = target_timezone.localize(datetime.combine(day, start.time().replace(second=0, microsecond=0)))
+        if due > after:
+            return due
+        day += timedelta(days=periodicity)
+
+
+def get_periodic_task_kwargs(habit_pk):
+    """ Возвращает параметры периодической задачи напоминания о привычке. """
+
+    return json.dumps({'habit_ids': [habit_pk]})
 
 
 def set_schedule(habit):
-    """ Создает периодическую задачу для привычки. """
+    """ Пересчитывает время следующего напоминания и создает периодическую задачу для привычки. """
+
+    set_schedules([habit])
 
-    if not habit.is_pleasure:
-        target_timezone = pytz.timezone(settings.TIME_ZONE)
-        converted_datetime = habit.time_to_perform.astimezone(target_timezone)
 
-        schedule, created = IntervalSchedule.objects.get_or_create(
-            every=habit.periodicity,
+def set_schedules(habits):
+    """
+    Пересчитывает время следующего напоминания и создает периодические задачи для пачки привычек.
+    В режимах диспетчера и redis периодические задачи не создаются: привычки отбираются задачей dispatch_due_habits,
+    в режиме redis время напоминания также записывается в отсортированное множество.
+    """
+
+    recompute_next_due_at(habits, timezone.now())
+
+    if settings.HABITS_SCHEDULER in ('dispatcher', 'redis'):
+        return
+
+    scheduled = [habit for habit in habits if habit.next_due_at is not None]
+    intervals = {}
+    for every in {habit.periodicity for habit in scheduled}:
+        intervals[every], created = IntervalSchedule.objects.get_or_create(
+            every=every,
             period=IntervalSchedule.MINUTES,
         )
-        PeriodicTask.objects.create(
-            interval=schedule,
+    PeriodicTask.objects.bulk_create([
+        PeriodicTask(
+            interval=intervals[habit.periodicity],
             name=str(habit.pk),
-            task='habits.tasks.send_telegram_message',
-            kwargs=json.dumps({
-                'chat_id': habit.owner.telegram_chat_id,
-                'action': habit.action.name,
-                'time': str(converted_datetime.time().replace(second=0, microsecond=0)),
-                'place': habit.place.name
-            })
-        )
+            task=REMINDER_TASK,
+            kwargs=get_periodic_task_kwargs(habit.pk)
+        ) for habit in scheduled
+    ])
+    if scheduled:
+        PeriodicTasks.update_changed()
 
 
 def delete_schedule(habit_pk):
     """ Удаляет периодическую задачу. """
 
-    if PeriodicTask.objects.filter(name=str(habit_pk)).exists():
-        periodic_task = PeriodicTask.objects.get(name=str(habit_pk))
-        periodic_task.delete()
+    delete_schedules([habit_pk])
+
+
+def delete_schedules(habit_pks):
+    """
+    Удаляет периодические задачи пачки привычек одним запросом.
+    В режиме redis удаляет привычки из отсортированного множества,
+    в режиме диспетчера ничего не делает: периодические задачи для привычек не создаются.
+    """
+
+    if settings.HABITS_SCHEDULER == 'redis':
+        if habit_pks:
+            get_redis().zrem(SCHEDULE_KEY, *habit_pks)
+        return
+    if settings.HABITS_SCHEDULER == 'dispatcher':
+        return
+
+    PeriodicTask.objects.filter(name__in=[str(habit_pk) for habit_pk in habit_pks]).delete()
+
+
+def get_due_habits(now):
+    """ Возвращает привычки, время напоминания о которых наступило (выборка по индексу next_due_at). """
+
+    return Habit.objects.filter(next_due_at__lte=now).only(*SCHEDULE_FIELDS)
+
+
+def advance_next_due_at(habits, now):
+    """ Переносит время следующего напоминания о привычках на их ближайший период после now. """
+
+    for habit in habits:
+        habit.next_due_at = get_next_due_at(habit, max(now, habit.next_due_at))
+    Habit.objects.bulk_update(habits, ['next_due_at'])
+    if settings.HABITS_SCHEDULER == 'redis':
+        update_redis_schedule(habits)
+
+
+def recompute_next_due_at(habits, now):
+    """ Пересчитывает время следующего напоминания о привычках без учета сохраненного значения. """
+
+    for habit in habits:
+        habit.next_due_at = get_next_due_at(habit, now)
+    Habit.objects.bulk_update(habits, ['next_due_at'])
+    if settings.HABITS_SCHEDULER == 'redis':
+        update_redis_schedule(habits)
+
+
+def update_redis_schedule(habits):
+    """ Записывает время следующего напоминания о привычках в отсортированное множество redis. """
+
+    pipeline = get_redis().pipeline(transaction=False)
+    for habit in habits:
+        if habit.next_due_at is None:
+            pipeline.zrem(SCHEDULE_KEY, habit.pk)
+        else:
+            pipeline.zadd(SCHEDULE_KEY, {habit.pk: habit.next_due_at.timestamp()})
+    pipeline.execute()
+
+
+def pop_due_habit_ids(now, count):
+    """
+    Атомарно извлекает из отсортированного множества redis привычки, время напоминания о которых наступило.
+    Возвращает словарь прежнего времени напоминания по идентификаторам привычек.
+    """
+
+    script = get_redis().register_script(POP_DUE_SCRIPT)
+    members = script(keys=[SCHEDULE_KEY], args=[now.timestamp(), count])
+    return {int(habit_pk): float(score) for habit_pk, score in zip(members[::2], members[1::2])}
+
+
+def restore_due_habit_ids(scores):
+    """ Возвращает в отсортированное множество redis извлеченные привычки с прежним временем напоминания. """
 
+    if scores:
+        get_redis().zadd(SCHEDULE_KEY, scores)
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from habits.cache import catalog_names, bump_public_feed_version
+from habits.models import Action, Place, Habit
+
+
+@receiver([post_save, post_delete], sender=Action)
+@receiver([post_save, post_delete], sender=Place)
+def catalog_changed(sender, **kwargs):
+    """
+    Сбрасывает кэш названий действий и мест и кэш ленты публичных привычек при их изменении или удалении.
+    Версии увеличиваются после фиксации транзакции, иначе прежние названия могут быть закэшированы под новой версией.
+    """
+
+    transaction.on_commit(catalog_names.bump_version)
+    transaction.on_commit(bump_public_feed_version)
+
+
+@receiver([post_save, post_delete], sender=Habit)
+def habit_changed(sender, instance, created=False, **kwargs):
+    """
+    Сбрасывает кэш ленты публичных привычек после фиксации транзакции при создании публичной привычки,
+    изменении или удалении привычки, которая была или стала публичной.
+    """
+
+    if created:
+        changed = instance.is_public
+    else:
+        changed = instance.is_public or instance.loaded_is_public is not False
+    if changed:
+        transaction.on_commit(bump_public_feed_version)
+    instance.loaded_is_public = instance.is_public
@@ -0,0 +1,153 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from habits.models import HabitCompletion, HabitStats
+
+# Количество последних дней, выполненные периоды которых хранятся в HabitStats.history.
+HISTORY_DAYS = 30
+HISTORY_MASK = (1 << HISTORY_DAYS) - 1
+
+# Окна в днях, за которые вычисляется доля выполненных периодов.
+RATE_DAYS = (7, 30)
+
+# Поля HabitStats, изменяемые при учете отметок.
+STATS_FIELDS = ('current_streak', 'longest_streak', 'last_period', 'streak_expires', 'history', 'history_date')
+
+
+def apply_completion(stats, periodicity, period_date):
+    """
+    Учитывает в статистике отметку о выполнении периода, начавшегося period_date, без чтения истории отметок.
+    Повторный учет того же периода статистику не меняет. Серия продолжается, если период следует сразу
+    за последним выполненным, и прерывается, если следующий за последним выполненным период закончился.
+    Периодичность 0 считается ежедневной, как и для напоминаний.
+    """
+
+    periodicity = periodicity or 1
+    if stats.history_date is None or period_date > stats.history_date:
+        shift = (period_date - stats.history_date).days if stats.history_date else HISTORY_DAYS
+        stats.history = (stats.history << shift) & HISTORY_MASK if shift < HISTORY_DAYS else 0
+        stats.history_date = period_date
+    offset = (stats.history_date - period_date).days
+    if offset < HISTORY_DAYS:
+        stats.history |= 1 << offset
+
+    if stats.last_period is None or period_date > stats.last_period:
+        if stats.last_period is not None and (period_date - stats.last_period).days == periodicity:
+            stats.current_streak += 1
+        else:
+            stats.current_streak = 1
+        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+        stats.last_period = period_date
+        stats.streak_expires = period_date + timedelta(days=2 * periodicity)
+
+
+def update_stats(completions, periodicities):
+    """
+    Учитывает в статистике привычек пачку отметок вида (идентификатор привычки, дата начала периода).
+    Количество запросов не зависит от количества отметок и привычек.
+    """
+
+    habit_pks = {habit_pk for habit_pk, _ in completions}
+    HabitStats.objects.bulk_create((HabitStats(habit_id=habit_pk) for habit_pk in habit_pks), ignore_conflicts=True)
+    stats = HabitStats.objects.select_for_update().in_bulk(habit_pks)
+    for habit_pk, period_date in sorted(completions, key=lambda completion: completion[1]):
+        apply_completion(stats[habit_pk], periodicities[habit_pk], period_date)
+    HabitStats.objects.bulk_update(stats.values(), STATS_FIELDS)
+
+
+def rebuild_stats(habits, today=None):
+    """
+    Пересчитывает статистику привычек по всем их отметкам и сохраняет ее одним запросом.
+    Строки статистики блокируются до чтения отметок, поэтому отметки, записываемые одновременно задачей
+    flush_habit_completions, учитываются ею уже в пересчитанной статистике.
+    """
+
+    today = today or timezone.localdate()
+    periodicities = {habit.pk: habit.periodicity for habit in habits}
+    list(HabitStats.objects.select_for_update().filter(habit_id__in=periodicities).values_list('pk'))
+    stats = {habit_pk: HabitStats(habit_id=habit_pk) for habit_pk in periodicities}
+    completions = HabitCompletion.objects.filter(habit_id__in=periodicities).order_by('habit', 'date')
+    for habit_pk, period_date in completions.values_list('habit_id', 'date'):
+        apply_completion(stats[habit_pk], periodicities[habit_pk], period_date)
+    for habit_stats in stats.values():
+        if habit_stats.streak_expires and habit_stats.streak_expires <= today:
+            habit_stats.current_streak = 0
+    HabitStats.objects.bulk_create(stats.values(), update_conflicts=True, unique_fields=('habit',),
+                                   update_fields=STATS_FIELDS)
+
+
+def expire_streaks(today=None):
+    """ Обнуляет текущие серии привычек, следующий период которых закончился без отметки о выполнении. """
+
+    today = today or timezone.localdate()
+    return HabitStats.objects.filter(current_streak__gt=0, streak_expires__lte=today).update(current_streak=0)
+
+
+def count_periods(habit, start, end):
+    """ Возвращает количество периодов привычки, начавшихся с start по end включительно. """
+
+    periodicity = habit.periodicity or 1
+    anchor = timezone.localtime(habit.time_to_perform).date()
+    if end < anchor:
+        return 0
+    first = max(0, -((anchor - start).days // periodicity))
+    last = (end - anchor).days // periodicity
+    return max(0, last - first + 1)
+
+
+def get_rate_counts(habit, stats, today, days):
+    """ Возвращает количество выполненных и наступивших периодов привычки за последние days дней. """
+
+    history = 0
+    if stats.history_date is not None:
+        shift = (today - stats.history_date).days
+        history = (stats.history << shift) & HISTORY_MASK if 0 <= shift < HISTORY_DAYS else 0
+    completed = (history & ((1 << days) - 1)).bit_count()
+    return completed, count_periods(habit, today - timedelta(days=days - 1), today)
+
+
+def get_stats(habit):
+    """ Возвращает HabitStats привычки, загруженную через select_related('stats'), или пустую статистику. """
+
+    try:
+        return habit.stats
+    except HabitStats.DoesNotExist:
+        return HabitStats(habit=habit)
+
+
+def get_habit_stats(habit, today=None):
+    """
+    Возвращает статистику привычки без чтения отметок.
+    Текущая серия считается прерванной, если она истекла, даже когда expire_streaks еще не запускалась.
+    """
+
+    today = today or timezone.localdate()
+    stats = get_stats(habit)
+    current_streak = stats.current_streak if stats.streak_expires and stats.streak_expires > today else 0
+    result = {'habit': habit.pk, 'current_streak': current_streak, 'longest_streak': stats.longest_streak,
+              'last_period': stats.last_period}
+    for days in RATE_DAYS:
+        completed, due = get_rate_counts(habit, stats, today, days)
+        result[f'completion_rate_{days}d'] = round(completed / due, 2) if due else None
+    return result
+
+
+def get_user_stats(habits, today=None):
+    """ Возвращает статистику пользователя, собранную из статистики его привычек. """
+
+    today = today or timezone.localdate()
+    habit_stats = [get_habit_stats(habit, today) for habit in habits]
+    result = {
+        'habits': len(habit_stats),
+        'active_streaks': sum(1 for stats in habit_stats if stats['current_streak']),
+        'longest_streak': max((stats['longest_streak'] for stats in habit_stats), default=0),
+    }
+    for days in RATE_DAYS:
+        completed = due = 0
+        for habit in habits:
+            habit_completed, habit_due = get_rate_counts(habit, get_stats(habit), today, days)
+            completed += habit_completed
+            due += habit_due
+        result[f'completion_rate_{days}d'] = round(completed / due, 2) if due else None
+    return result
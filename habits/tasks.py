@@ -1,15 +1,224 @@
-from celery import shared_task
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 import requests
+from celery import shared_task
+from django.db import transaction
+from django.utils import timezone
 from config import settings
+from habits.cache import catalog_names
+from habits.completions import flush_completions, recover_completions
+from habits.models import Habit, ScheduleOutbox
+from habits.popularity import refresh_popularity
+from habits.services import get_due_habits, get_messages, get_message_text, advance_next_due_at, pop_due_habit_ids, \
+    restore_due_habit_ids, set_schedules, delete_schedules, get_reply_markup, SCHEDULE_FIELDS
+from habits.stats import expire_streaks
+from habits.telegram import get_sender
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def send_telegram_message(**kwargs):
     """ Отправляет уведомление не telegram пользователя с напоминанием о полезной привычке. """
 
-    params = {'chat_id': kwargs['chat_id'], 'text': f"Я буду {kwargs['action']} в {kwargs['time']} в {kwargs['place']}"}
-    message = requests.post(f'https://api.telegram.org/bot{settings.BOT_API_TOKEN}/sendMessage', params=params)
-    print(message.status_code)
+    response = get_sender().send_message(kwargs['chat_id'], get_message_text(kwargs), **get_reply_markup(kwargs))
+    return response.status_code
+
+
+def _send_message(sender, message):
+    """ Отправляет одно напоминание из пачки и возвращает результат отправки. """
+
+    try:
+        response = sender.send_message(message['chat_id'], get_message_text(message), **get_reply_markup(message))
+    except requests.RequestException as error:
+        logger.error('Не удалось отправить сообщение в чат %s: %s', message['chat_id'], error)
+        return {'chat_id': message['chat_id'], 'ok': False, 'error': str(error)}
+    return {'chat_id': message['chat_id'], 'ok': response.ok, 'status_code': response.status_code}
+
+
+def send_messages(messages):
+    """
+    Отправляет напоминания из get_messages параллельно через общий пул соединений.
+    Возвращает результат отправки каждого сообщения.
+    """
+
+    sender = get_sender()
+    with ThreadPoolExecutor(max_workers=settings.TELEGRAM_POOL_SIZE) as executor:
+        return list(executor.map(partial(_send_message, sender), messages))
+
+
+@shared_task
+def send_telegram_messages(messages):
+    """ Отправляет пачку готовых напоминаний о полезных привычках. """
+
+    return send_messages(messages)
+
+
+def get_reminder_habits(habit_ids):
+    """
+    Загружает привычки с владельцами одним запросом, названия действий и мест берет из кэша справочников.
+    Количество запросов не зависит от количества привычек.
+    """
+
+    habits = list(Habit.objects.filter(pk__in=habit_ids, is_pleasure=False).select_related('owner').only(
+        'pk', 'time_to_perform', 'action', 'place', 'owner__telegram_chat_id', 'owner__coalesce_reminders'))
+    return catalog_names.resolve(habits)
+
+
+@shared_task
+def send_habit_reminders(habit_ids):
+    """
+    Отправляет напоминания о привычках по их идентификаторам.
+    Содержимое напоминаний определяется в момент отправки, поэтому всегда соответствует актуальным данным.
+    """
+
+    habits = get_reminder_habits(habit_ids)
+    messages = get_messages(habits)
+    logger.info('Напоминания о %s привычках отправляются %s сообщениями', len(habits), len(messages))
+    return send_messages(messages)
+
+
+def batch_by_owner(habits, batch_size):
+    """ Делит привычки на пачки примерно по batch_size, не разделяя привычки одного владельца. """
+
+    batch = []
+    for habit in sorted(habits, key=lambda habit: habit.owner_id or 0):
+        if len(batch) >= batch_size and batch[-1].owner_id != habit.owner_id:
+            yield batch
+            batch = []
+        batch.append(habit)
+    if batch:
+        yield batch
+
+
+def pop_due_habits(now, popped):
+    """
+    Извлекает из отсортированного множества redis не больше HABITS_DISPATCH_BATCH_SIZE привычек,
+    время напоминания о которых наступило, и записывает их прежнее время напоминания в popped.
+    Возвращает None, если таких привычек в множестве нет.
+    """
+
+    popped.update(pop_due_habit_ids(now, settings.HABITS_DISPATCH_BATCH_SIZE))
+    if not popped:
+        return None
+    return list(Habit.objects.filter(pk__in=popped, next_due_at__isnull=False).only(*SCHEDULE_FIELDS))
+
 
+def claim_due_habits(now, popped):
+    """
+    Отбирает и блокирует не больше HABITS_DISPATCH_BATCH_SIZE привычек, время напоминания о которых наступило.
+    Привычки, заблокированные другим диспетчером, пропускаются. Возвращает None, если таких привычек больше нет.
+    """
+
+    if settings.HABITS_SCHEDULER == 'redis':
+        return pop_due_habits(now, popped)
+    habits = list(get_due_habits(now).order_by('next_due_at').select_for_update(skip_locked=True)[
+                  :settings.HABITS_DISPATCH_BATCH_SIZE])
+    return habits or None
+
+
+@shared_task
+def dispatch_due_habits():
+    """
+    Отбирает привычки, время выполнения которых наступило, пачками по HABITS_DISPATCH_BATCH_SIZE привычек,
+    переносит их время напоминания в отдельной транзакции на каждую пачку и ставит в очередь отправку напоминаний
+    пачки в одной задаче. Запускается celery beat каждую минуту, работает только в режимах диспетчера и redis.
+    Если транзакция пачки не зафиксирована, извлеченные из множества redis привычки возвращаются в него.
+    """
+
+    if settings.HABITS_SCHEDULER not in ('dispatcher', 'redis'):
+        return 0
+
+    now = timezone.now()
+    dispatched = 0
+    while True:
+        popped = {}
+        try:
+            with transaction.atomic():
+                habits = claim_due_habits(now, popped)
+                if habits is None:
+                    return dispatched
+                advance_next_due_at(habits, now)
+        except Exception:
+            restore_due_habit_ids(popped)
+            raise
+
+        for batch in batch_by_owner(habits, settings.HABITS_DISPATCH_BATCH_SIZE):
+            send_habit_reminders.delay([habit.pk for habit in batch])
+        dispatched += len(habits)
+
+
+def enqueue_schedule_changes(habit_pks, operation):
+    """
+    Записывает изменения расписания привычек в outbox в текущей транзакции.
+    Расписание изменяется задачей process_schedule_outbox после фиксации транзакции.
+    """
+
+    ScheduleOutbox.objects.bulk_create(
+        ScheduleOutbox(habit_id=habit_pk, operation=operation) for habit_pk in habit_pks)
+    transaction.on_commit(process_schedule_outbox.delay)
+
+
+@shared_task
+def process_schedule_outbox():
+    """
+    Применяет изменения расписания из outbox пачками по HABITS_OUTBOX_BATCH_SIZE.
+    Из нескольких изменений одной привычки в пачке применяется последнее.
+    Запускается после фиксации транзакции с изменением привычки и раз в минуту celery beat.
+    """
+
+    processed = 0
+    while True:
+        with transaction.atomic():
+            entries = list(ScheduleOutbox.objects.select_for_update(skip_locked=True).order_by('pk')[
+                           :settings.HABITS_OUTBOX_BATCH_SIZE])
+            if not entries:
+                return processed
+
+            operations = {entry.habit_id: entry.operation for entry in entries}
+            delete_schedules(list(operations))
+            habit_pks = [habit_pk for habit_pk, operation in operations.items() if operation == ScheduleOutbox.SET]
+            set_schedules(list(Habit.objects.filter(pk__in=habit_pks).only(*SCHEDULE_FIELDS)))
+            ScheduleOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+
+        processed += len(entries)
+
+
+@shared_task
+def flush_habit_completions():
+    """
+    Записывает отметки о выполнении привычек из буфера redis в базу пачками по HABITS_COMPLETION_BATCH_SIZE.
+    Запускается при заполнении пачки и celery beat раз в HABITS_COMPLETION_FLUSH_INTERVAL секунд.
+    Перед записью возвращает в буфер отметки, оставшиеся в списках обработки упавших воркеров.
+    """
+
+    recover_completions()
+    flushed = 0
+    while True:
+        count = flush_completions(settings.HABITS_COMPLETION_BATCH_SIZE)
+        flushed += count
+        if count < settings.HABITS_COMPLETION_BATCH_SIZE:
+            return flushed
+
+
+@shared_task
+def expire_habit_streaks():
+    """
+    Обнуляет текущие серии привычек, следующий период которых закончился без отметки о выполнении.
+    Запускается celery beat каждый час.
+    """
+
+    return expire_streaks()
+
+
+@shared_task
+def refresh_habit_popularity():
+    """
+    Пересчитывает списки популярных действий, мест и публичных привычек.
+    Запускается celery beat раз в половину HABITS_POPULARITY_MAX_AGE.
+    """
 
+    refresh_popularity()
 
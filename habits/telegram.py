@@ -0,0 +1,124 @@
+import logging
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import settings
+from habits.services import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Корзина токенов для каждого ключа: ARGV содержит пары (скорость пополнения в секунду, емкость).
+# Токен списывается сразу из всех корзин или ни из одной, скрипт возвращает время ожидания в секундах.
+TOKEN_BUCKET_SCRIPT = """
+local now_time = redis.call('TIME')
+local now = tonumber(now_time[1]) + tonumber(now_time[2]) / 1000000
+local wait = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    available = math.min(capacity, available + math.max(0, now - ts) * rate)
+    tokens[i] = available
+    if available < 1 then
+        wait = math.max(wait, (1 - available) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return '0'
+"""
+
+
+class RateLimiter:
+    """ Ограничитель частоты отправки сообщений: общий и для каждого чата, общий для всех воркеров через redis. """
+
+    def __init__(self, global_rate, chat_rate, key_prefix='telegram:rate'):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.key_prefix = key_prefix
+        self.script = get_redis().register_script(TOKEN_BUCKET_SCRIPT)
+
+    def try_acquire(self, chat_id):
+        """ Списывает токен на отправку сообщения в чат, возвращает время ожидания если токенов нет. """
+
+        keys = [f'{self.key_prefix}:global', f'{self.key_prefix}:chat:{chat_id}']
+        args = [self.global_rate, max(self.global_rate, 1), self.chat_rate, max(self.chat_rate, 1)]
+        return float(self.script(keys=keys, args=args))
+
+    def acquire(self, chat_id, timeout=None):
+        """ Ожидает возможности отправить сообщение в чат не дольше timeout секунд. """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(chat_id)
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class TelegramSender:
+    """ Отправляет сообщения через Bot API, переиспользуя пул постоянных HTTP соединений. """
+
+    def __init__(self, api_url, token, rate_limiter=None, pool_size=10, timeout=10, max_retries=3):
+        self.url = f'{api_url.rstrip("/")}/bot{token}'
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def send_message(self, chat_id, text, **params):
+        """ Отправляет сообщение в чат, при ответе 429 повторяет отправку после указанной telegram паузы. """
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(chat_id)
+            response = self.session.post(f'{self.url}/sendMessage', json={'chat_id': chat_id, 'text': text, **params},
+                                         timeout=self.timeout)
+            if response.status_code != 429 or attempt == self.max_retries:
+                break
+            retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+            logger.warning('Telegram ограничил отправку в чат %s, повтор через %s с', chat_id, retry_after)
+            time.sleep(retry_after)
+
+        if not response.ok:
+            logger.error('Не удалось отправить сообщение в чат %s: %s %s', chat_id, response.status_code, response.text)
+        return response
+
+
+_sender = None
+_sender_pid = None
+
+
+def get_sender():
+    """ Возвращает отправителя сообщений, общего для процесса воркера. """
+
+    global _sender, _sender_pid
+    if _sender is None or _sender_pid != os.getpid():
+        _sender = TelegramSender(
+            api_url=settings.TELEGRAM_API_URL,
+            token=settings.BOT_API_TOKEN,
+            rate_limiter=RateLimiter(settings.TELEGRAM_GLOBAL_RATE_LIMIT, settings.TELEGRAM_CHAT_RATE_LIMIT),
+            pool_size=settings.TELEGRAM_POOL_SIZE,
+            timeout=settings.TELEGRAM_TIMEOUT,
+            max_retries=settings.TELEGRAM_MAX_RETRIES,
+        )
+        _sender_pid = os.getpid()
+    return _sender
@@ -0,0 +1,131 @@
+import hashlib
+import string
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask, IntervalSchedule
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from habits.cache import bump_public_feed_version
+from habits.models import Place, Action, Habit
+from habits.services import delete_schedule, get_due_habits, REMINDER_TASK
+from users.models import User
+
+USERS = 500
+HABITS_PER_USER = 40
+# Доля публичных привычек - каждая PUBLIC_EVERY-я.
+PUBLIC_EVERY = 20
+PERIODIC_TASKS = 5000
+PLACES = 20000
+
+
+class QueryPlanTestCase(APITestCase):
+    """
+    Проверка планов основных запросов к привычкам на большом наборе данных:
+    каждый запрос должен выполняться по индексу, а не полным просмотром таблицы.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create(User(email=f'plan_{number}@test.ru') for number in range(USERS))
+        place = Place.objects.create(name='plan_place')
+        action = Action.objects.create(name='plan_action')
+        now = timezone.now()
+        # Привычки пользователей чередуются, поэтому привычки одного пользователя разбросаны по таблице.
+        Habit.objects.bulk_create(
+            Habit(owner=cls.users[number % USERS], place=place, action=action, reward='yes',
+                  is_public=number % PUBLIC_EVERY == 0, next_due_at=now + timedelta(minutes=number))
+            for number in range(USERS * HABITS_PER_USER))
+        Place.objects.bulk_create(Place(name=cls.get_place_name(number)) for number in range(PLACES))
+        interval = IntervalSchedule.objects.create(every=1, period=IntervalSchedule.DAYS)
+        PeriodicTask.objects.bulk_create(
+            PeriodicTask(name=str(number), task=REMINDER_TASK, interval=interval) for number in range(PERIODIC_TASKS))
+        with connection.cursor() as cursor:
+            # Строки, добавленные в GIN индекс, попадают в список ожидания, который обычно переносит в индекс VACUUM.
+            for index in ('habits_place_name_trgm', 'habits_place_description_trgm'):
+                cursor.execute('SELECT gin_clean_pending_list(%s::regclass)', [index])
+            cursor.execute('ANALYZE')
+
+    @staticmethod
+    def get_place_name(number):
+        """ Возвращает название места из двух случайных слов, различающихся у разных мест. """
+
+        letters = [string.ascii_lowercase[byte % 26] for byte in hashlib.md5(str(number).encode()).digest()]
+        return f'{"".join(letters[:8])} {"".join(letters[8:])}'
+
+    def get_plans(self, queries, table):
+        """ Возвращает планы выполненных запросов к таблице. """
+
+        plans = []
+        for query in queries:
+            if f'FROM "{table}"' not in query['sql']:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN {query["sql"]}')
+                plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        return plans
+
+    def assertIndexScans(self, queries, table):
+        plans = self.get_plans(queries, table)
+        self.assertTrue(plans, f'Нет запросов к таблице {table}')
+        for plan in plans:
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+            self.assertIn('Index', plan)
+
+    def test_habit_list_plan(self):
+        """ Тестирование выборки привычек пользователя по индексу (owner, id) """
+        self.client.force_authenticate(self.users[0])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/habits/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], HABITS_PER_USER)
+        self.assertIndexScans(context.captured_queries, 'habits_habit')
+        self.assertTrue(any('habits_habit_owner_id_idx' in plan
+                            for plan in self.get_plans(context.captured_queries, 'habits_habit')))
+
+    def test_public_list_plan(self):
+        """ Тестирование выборки ленты публичных привычек по частичному индексу """
+        bump_public_feed_version()
+        self.client.force_authenticate(self.users[0])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/habits/public/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], USERS * HABITS_PER_USER // PUBLIC_EVERY)
+        self.assertIndexScans(context.captured_queries, 'habits_habit')
+        self.assertTrue(any('habits_habit_public_id_idx' in plan
+                            for plan in self.get_plans(context.captured_queries, 'habits_habit')))
+
+    def test_delete_schedule_plan(self):
+        """ Тестирование поиска периодической задачи привычки по уникальному индексу названия """
+        with CaptureQueriesContext(connection) as context:
+            delete_schedule(PERIODIC_TASKS // 2)
+        self.assertFalse(PeriodicTask.objects.filter(name=str(PERIODIC_TASKS // 2)).exists())
+        self.assertIndexScans(context.captured_queries, 'django_celery_beat_periodictask')
+
+    def test_due_habits_plan(self):
+        """ Тестирование выборки привычек, время напоминания о которых наступило, по индексу next_due_at """
+        with CaptureQueriesContext(connection) as context:
+            habits = list(get_due_habits(timezone.now() + timedelta(minutes=10)))
+        self.assertEqual(len(habits), 11)
+        self.assertIndexScans(context.captured_queries, 'habits_habit')
+
+    def test_search_place_plan(self):
+        """ Тестирование поиска и подсказок мест по триграммному индексу названия """
+        name = self.get_place_name(PLACES // 2)
+        self.client.force_authenticate(self.users[0])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/habits/places/', {'search': name[:6]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['name'], name)
+        self.assertIndexScans(context.captured_queries, 'habits_place')
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/habits/places/suggest/', {'q': name[:6]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['name'], name)
+        self.assertIndexScans(context.captured_queries, 'habits_place')
+        self.assertTrue(all('habits_place_name_trgm' in plan
+                            for plan in self.get_plans(context.captured_queries, 'habits_place')))
@@ -1,15 +1,41 @@
+import json
+import msgpack
+import os
 import pytz
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import patch
 
-from django_celery_beat.models import PeriodicTask
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction, connection, DatabaseError
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask, IntervalSchedule
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import AccessToken
 
 from config import settings
-from habits.models import Place, Action, Habit
+from habits.cache import bump_public_feed_version
+from habits.completions import get_period_date, flush_completions, enqueue_completion
+from habits.export import EXPORT_FIELDS
+from habits.mixins import ValuesRepresentation
+from habits.models import Place, Action, Habit, ScheduleOutbox, HabitCompletion, HabitStats
 from habits.permissions import IsOwnerOrStaff
-from habits.services import set_schedule, delete_schedule
-from habits.tasks import send_telegram_message
+from habits.renderers import ORJSONRenderer
+from habits.serializers import HabitSerializer
+from habits.stats import get_habit_stats, expire_streaks, apply_completion
+from habits.services import set_schedule, delete_schedule, get_due_habits, get_next_due_at, get_messages, \
+    get_message_text, get_redis, get_reply_markup, REMINDER_TASK
+from habits.tasks import send_telegram_message, send_telegram_messages, dispatch_due_habits, batch_by_owner, \
+    get_reminder_habits, process_schedule_outbox, enqueue_schedule_changes, flush_habit_completions
+from habits.telegram import TelegramSender, RateLimiter
 from habits.views import HabitRetrieveAPIView
 from users.models import User
 
@@ -64,6 +90,28 @@ class HabitTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.json(), {'name': ['Обязательное поле.']})
 
+    def test_search_place(self):
+        """ Тестирование поиска мест по сходству, подсказок и списка похожих мест при создании """
+        for name in ('running track', 'city park', 'parking lot'):
+            Place.objects.create(name=name)
+        response = self.client.get('/habits/places/?search=park')
+        self.assertEqual([place['name'] for place in response.json()['results']], ['city park', 'parking lot'])
+        response = self.client.get('/habits/places/?search=PARK (*')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get('/habits/places/suggest/?q=runing&limit=1')
+        self.assertEqual([place['name'] for place in response.json()], ['running track'])
+        response = self.client.get('/habits/places/suggest/?q=park&limit=0')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post('/habits/places/', {'name': 'City Park'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Place.objects.filter(pk=response.json()['id'], name='City Park').exists())
+        self.assertEqual([place['name'] for place in response.json()['similar']], ['city park'])
+        response = self.client.post('/habits/places/', {'name': 'swimming pool'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('similar', response.json())
+
     def test_list_place(self):
         """ Тестирование получения списка мест """
         places = list(Place.objects.all())
@@ -176,6 +224,7 @@ class HabitTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(Habit.objects.filter(id=response.json().get('id')).exists())
         # Проверка автоматического создания периодической задачи для привычки при создании привычки
+        process_schedule_outbox()
         self.assertTrue(PeriodicTask.objects.filter(name=response.json().get('id')).exists())
 
 
@@ -187,6 +236,40 @@ class HabitTestCase(APITestCase):
         self.assertEqual(response.json()['count'], len(habits))
         self.assertEqual(response.json()['results'][0]['id'], habits[0].pk)
 
+    def test_list_habit_cursor_pagination(self):
+        """ Тестирование получения списка привычек с пагинацией по курсору """
+        habits = list(Habit.objects.all())
+        response = self.client.get('/habits/', {'pagination': 'cursor', 'page_size': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.json())
+        self.assertEqual(response.json()['results'][0]['id'], habits[0].pk)
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['id'], habits[1].pk)
+        self.assertIsNone(response.json()['next'])
+
+    def test_list_habit_expand(self):
+        """ Тестирование раскрытия связанных объектов в списке привычек за постоянное количество запросов """
+        Habit.objects.bulk_create(
+            Habit(owner=self.user, place=self.place, action=self.action, pleasure_habit=self.pleasure_habit)
+            for _ in range(30))
+        # Аутентификация, количество привычек и страница привычек
+        with self.assertNumQueries(3):
+            response = self.client.get('/habits/', {'expand': 'place,action,pleasure_habit,owner', 'page_size': 30})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        habit = response.json()['results'][-1]
+        self.assertEqual(habit['place'], {'id': self.place.pk, 'name': self.place.name, 'description': None})
+        self.assertEqual(habit['action']['name'], self.action.name)
+        self.assertEqual(habit['pleasure_habit']['id'], self.pleasure_habit.pk)
+        self.assertEqual(habit['owner']['pk'], self.user.pk)
+
+        response = self.client.get(f'/habits/{self.useful_habit.pk}/', {'expand': 'place'})
+        self.assertEqual(response.json()['place']['name'], self.place.name)
+        self.assertEqual(response.json()['action'], self.action.pk)
+
+        response = self.client.get('/habits/', {'expand': 'reward'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_retrieve_habit(self):
         """ Тестирование получения привычки """
         response = self.client.get(f'/habits/{self.useful_habit.pk}/')
@@ -252,6 +335,690 @@ class HabitTestCase(APITestCase):
 
         send_telegram_message.apply_async(kwargs=kwargs)
 
+    @patch.object(settings, 'HABITS_SCHEDULER', 'dispatcher')
+    def test_schedule_in_dispatcher_mode(self):
+        """ Тестирование отсутствия периодических задач в режиме диспетчера """
+        set_schedule(self.useful_habit)
+        self.assertFalse(PeriodicTask.objects.filter(name=self.useful_habit.pk).exists())
+        delete_schedule(self.useful_habit.pk)
+
+    def test_next_due_at(self):
+        """ Тестирование вычисления времени следующего напоминания """
+        set_schedule(self.useful_habit)
+        self.useful_habit.refresh_from_db()
+        first_due = self.useful_habit.time_to_perform.replace(second=0, microsecond=0)
+        self.assertEqual(self.useful_habit.next_due_at, first_due + timedelta(days=1))
+        self.assertEqual(get_next_due_at(self.useful_habit, first_due + timedelta(days=5)), first_due + timedelta(days=6))
+        self.useful_habit.periodicity = 3
+        self.assertEqual(get_next_due_at(self.useful_habit, first_due + timedelta(days=4)), first_due + timedelta(days=6))
+        set_schedule(self.pleasure_habit)
+        self.pleasure_habit.refresh_from_db()
+        self.assertIsNone(self.pleasure_habit.next_due_at)
+
+    @patch.object(settings, 'HABITS_SCHEDULER', 'dispatcher')
+    def test_get_due_habits(self):
+        """ Тестирование отбора привычек, время выполнения которых наступило """
+        set_schedule(self.useful_habit)
+        due = self.useful_habit.next_due_at
+        self.assertEqual(list(get_due_habits(due - timedelta(minutes=1))), [])
+        self.assertEqual(list(get_due_habits(due)), [self.useful_habit])
+
+    @patch.object(settings, 'HABITS_SCHEDULER', 'dispatcher')
+    @patch.object(settings, 'HABITS_DISPATCH_BATCH_SIZE', 1)
+    @patch('habits.tasks.send_habit_reminders.delay')
+    def test_dispatch_due_habits(self, mock_delay):
+        """ Тестирование отправки напоминаний пачками по привычкам, время выполнения которых наступило """
+        other_user = User.objects.create(email='other@test.ru')
+        other_habit = Habit.objects.create(owner=other_user, place=self.place, action=self.action, reward='yes')
+        set_schedule(self.useful_habit)
+        set_schedule(other_habit)
+        due = max(self.useful_habit.next_due_at, other_habit.next_due_at)
+        with patch('habits.tasks.timezone.now', return_value=due), CaptureQueriesContext(connection) as context:
+            self.assertEqual(dispatch_due_habits(), 2)
+            self.assertEqual(mock_delay.call_count, 2)
+            # Привычки отбираются пачками по HABITS_DISPATCH_BATCH_SIZE до пустой пачки.
+            claims = [query['sql'] for query in context.captured_queries if 'SKIP LOCKED' in query['sql']]
+            self.assertEqual(len(claims), 3)
+            self.assertIn('LIMIT 1', claims[0])
+            self.useful_habit.refresh_from_db()
+            self.assertEqual(self.useful_habit.next_due_at, due + timedelta(days=1))
+            self.assertEqual(dispatch_due_habits(), 0)
+
+    @patch.object(settings, 'HABITS_SCHEDULER', 'redis')
+    @patch('habits.services.SCHEDULE_KEY', 'test:habits:schedule')
+    @patch('habits.tasks.send_habit_reminders.delay')
+    def test_redis_schedule(self, mock_delay):
+        """ Тестирование планирования напоминаний в отсортированном множестве redis """
+        redis_client = get_redis()
+        self.addCleanup(redis_client.delete, 'test:habits:schedule')
+        set_schedule(self.useful_habit)
+        set_schedule(self.pleasure_habit)
+        due = self.useful_habit.next_due_at
+        self.assertEqual(redis_client.zscore('test:habits:schedule', self.useful_habit.pk), due.timestamp())
+        self.assertIsNone(redis_client.zscore('test:habits:schedule', self.pleasure_habit.pk))
+
+        with patch('habits.tasks.timezone.now', return_value=due):
+            self.assertEqual(dispatch_due_habits(), 1)
+            mock_delay.assert_called_once_with([self.useful_habit.pk])
+            self.assertEqual(dispatch_due_habits(), 0)
+        next_due = (due + timedelta(days=1)).timestamp()
+        self.assertEqual(redis_client.zscore('test:habits:schedule', self.useful_habit.pk), next_due)
+
+        delete_schedule(self.useful_habit.pk)
+        self.assertIsNone(redis_client.zscore('test:habits:schedule', self.useful_habit.pk))
+
+    @patch.object(settings, 'HABITS_SCHEDULER', 'redis')
+    @patch('habits.services.SCHEDULE_KEY', 'test:habits:schedule')
+    @patch('habits.tasks.send_habit_reminders.delay')
+    def test_redis_schedule_rollback(self, mock_delay):
+        """ Тестирование возврата привычек в отсортированное множество redis при откате транзакции диспетчера """
+        redis_client = get_redis()
+        self.addCleanup(redis_client.delete, 'test:habits:schedule')
+        set_schedule(self.useful_habit)
+        due = self.useful_habit.next_due_at
+
+        with patch('habits.tasks.timezone.now', return_value=due), \
+                patch('habits.tasks.advance_next_due_at', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                dispatch_due_habits()
+        mock_delay.assert_not_called()
+        self.assertEqual(redis_client.zscore('test:habits:schedule', self.useful_habit.pk), due.timestamp())
+        self.useful_habit.refresh_from_db()
+        self.assertEqual(self.useful_habit.next_due_at, due)
+
+    def test_sync_schedules_periodic_tasks(self):
+        """ Тестирование сверки периодических задач с привычками """
+        set_schedule(self.useful_habit)
+        other_habit = Habit.objects.create(owner=self.user, place=self.place, action=self.action, reward='yes')
+        interval = IntervalSchedule.objects.create(every=5, period=IntervalSchedule.MINUTES)
+        PeriodicTask.objects.filter(name=self.useful_habit.pk).update(interval=interval)
+        PeriodicTask.objects.create(name=str(self.pleasure_habit.pk), task=REMINDER_TASK, interval=interval)
+        PeriodicTask.objects.create(name='999999', task=REMINDER_TASK, interval=interval)
+
+        output = StringIO()
+        call_command('sync_schedules', dry_run=True, stdout=output)
+        self.assertIn('periodic_task_created: 1', output.getvalue())
+        self.assertIn('periodic_task_updated: 1', output.getvalue())
+        self.assertIn('periodic_task_deleted: 2', output.getvalue())
+        self.assertFalse(PeriodicTask.objects.filter(name=other_habit.pk).exists())
+
+        call_command('sync_schedules', chunk_size=1, stdout=StringIO())
+        self.assertTrue(PeriodicTask.objects.filter(name=other_habit.pk).exists())
+        self.assertEqual(PeriodicTask.objects.get(name=self.useful_habit.pk).interval.every, 1)
+        self.assertFalse(PeriodicTask.objects.filter(name__in=[str(self.pleasure_habit.pk), '999999']).exists())
+
+        output = StringIO()
+        call_command('sync_schedules', dry_run=True, stdout=output)
+        self.assertIn('periodic_task_created: 0', output.getvalue())
+        self.assertIn('periodic_task_updated: 0', output.getvalue())
+        self.assertIn('periodic_task_deleted: 0', output.getvalue())
+
+    def test_sync_schedules_mode_switch(self):
+        """ Тестирование удаления периодических задач напоминаний после перехода в режим dispatcher """
+        set_schedule(self.useful_habit)
+        interval = IntervalSchedule.objects.get(every=1, period=IntervalSchedule.MINUTES)
+        PeriodicTask.objects.create(name='999999', task=REMINDER_TASK, interval=interval)
+        PeriodicTask.objects.create(name='other', task='habits.tasks.dispatch_due_habits', interval=interval)
+
+        with patch.object(settings, 'HABITS_SCHEDULER', 'dispatcher'):
+            output = StringIO()
+            call_command('sync_schedules', dry_run=True, stdout=output)
+            self.assertIn('periodic_task_deleted: 2', output.getvalue())
+            self.assertEqual(PeriodicTask.objects.count(), 3)
+
+            call_command('sync_schedules', chunk_size=1, stdout=StringIO())
+        self.assertEqual(list(PeriodicTask.objects.values_list('name', flat=True)), ['other'])
+
+    @patch.object(settings, 'HABITS_SCHEDULER', 'redis')
+    @patch('habits.services.SCHEDULE_KEY', 'test:habits:sync')
+    @patch('habits.management.commands.sync_schedules.SCHEDULE_KEY', 'test:habits:sync')
+    def test_sync_schedules_redis(self):
+        """ Тестирование сверки отсортированного множества redis с привычками """
+        redis_client = get_redis()
+        self.addCleanup(redis_client.delete, 'test:habits:sync')
+        redis_client.zadd('test:habits:sync', {999999: 0, self.pleasure_habit.pk: 0})
+
+        call_command('sync_schedules', stdout=StringIO())
+        self.useful_habit.refresh_from_db()
+        self.assertEqual(redis_client.zrange('test:habits:sync', 0, -1), [str(self.useful_habit.pk).encode()])
+        self.assertEqual(redis_client.zscore('test:habits:sync', self.useful_habit.pk),
+                         self.useful_habit.next_due_at.timestamp())
+
+    def test_schedule_outbox(self):
+        """ Тестирование применения изменений расписания из outbox после фиксации транзакции """
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch(f'/habits/{self.useful_habit.pk}/update/',
+                                         {'reward': 'new_reward', 'periodicity': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue(ScheduleOutbox.objects.filter(habit_id=self.useful_habit.pk).exists())
+        self.assertFalse(PeriodicTask.objects.filter(name=self.useful_habit.pk).exists())
+
+        self.assertEqual(process_schedule_outbox(), 1)
+        self.assertEqual(PeriodicTask.objects.get(name=self.useful_habit.pk).interval.every, 2)
+        self.assertFalse(ScheduleOutbox.objects.exists())
+
+        self.client.delete(f'/habits/{self.useful_habit.pk}/delete/')
+        self.assertEqual(process_schedule_outbox(), 1)
+        self.assertFalse(PeriodicTask.objects.filter(name=self.useful_habit.pk).exists())
+
+    def test_schedule_outbox_rollback(self):
+        """ Тестирование отсутствия изменений расписания в outbox при откате транзакции """
+        try:
+            with transaction.atomic():
+                enqueue_schedule_changes([self.useful_habit.pk], ScheduleOutbox.SET)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(ScheduleOutbox.objects.exists())
+
+    def test_batch_by_owner(self):
+        """ Тестирование деления привычек на пачки без разделения привычек одного владельца """
+        other_habit = Habit.objects.create(owner=self.user, place=self.place, action=self.action, reward='yes')
+        self.assertEqual(len(list(batch_by_owner([self.useful_habit, other_habit], 1))), 1)
+
+    def test_get_reminder_habits(self):
+        """ Тестирование загрузки привычек для напоминаний за постоянное количество запросов """
+        habits = Habit.objects.bulk_create(
+            Habit(owner=self.user, place=self.place, action=self.action, reward='yes') for _ in range(20))
+        habit_ids = [habit.pk for habit in habits]
+        get_reminder_habits(habit_ids)
+        with self.assertNumQueries(1):
+            reminder_habits = get_reminder_habits(habit_ids)
+        self.assertEqual(reminder_habits[0].action.name, self.action.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.action.name = 'renamed_action'
+            self.action.save()
+            # До фиксации переименования кэш названий не сбрасывается.
+            with self.assertNumQueries(1):
+                self.assertEqual(get_reminder_habits(habit_ids)[0].action.name, reminder_habits[0].action.name)
+        with self.assertNumQueries(3):
+            reminder_habits = get_reminder_habits(habit_ids)
+        self.assertEqual(reminder_habits[0].action.name, 'renamed_action')
+
+    def test_coalesce_messages(self):
+        """ Тестирование объединения одновременных напоминаний пользователя в одно сообщение """
+        self.user.telegram_chat_id = 1
+        other_habit = Habit.objects.create(owner=self.user, place=self.place, action=self.action, reward='yes')
+        messages = get_messages([self.useful_habit, other_habit])
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(len(messages[0]['reminders']), 2)
+        self.assertEqual(get_message_text(messages[0]).count('Я буду test_action'), 2)
+        self.user.coalesce_reminders = False
+        self.assertEqual(len(get_messages([self.useful_habit, other_habit])), 2)
+        with patch.object(settings, 'HABITS_COALESCE_REMINDERS', False):
+            self.user.coalesce_reminders = True
+            self.assertEqual(len(get_messages([self.useful_habit, other_habit])), 2)
+
+    def test_recompute_next_due_at_command(self):
+        """ Тестирование команды пересчета времени следующего напоминания """
+        call_command('recompute_next_due_at', chunk_size=1, stdout=StringIO())
+        self.useful_habit.refresh_from_db()
+        self.pleasure_habit.refresh_from_db()
+        self.assertIsNotNone(self.useful_habit.next_due_at)
+        self.assertIsNone(self.pleasure_habit.next_due_at)
+
+    def test_public_feed_cache(self):
+        """ Тестирование кэширования ленты публичных привычек """
+        bump_public_feed_version()
+        response = self.client.get('/habits/public/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 0)
+        # Единственный запрос к базе при попадании в кэш - загрузка пользователя при аутентификации.
+        with self.assertNumQueries(1):
+            response = self.client.get('/habits/public/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['count'], 0)
+        self.assertEqual(self.client.get('/habits/public/?page_size=10')['X-Cache'], 'MISS')
+
+        stats = self.client.get('/habits/public/cache-stats/').json()
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertGreaterEqual(stats['misses'], 2)
+
+    def test_public_feed_cache_invalidation(self):
+        """ Тестирование сброса кэша ленты публичных привычек после фиксации изменений привычек """
+        self.client.get('/habits/public/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.useful_habit.is_public = True
+            self.useful_habit.save()
+            self.assertEqual(self.client.get('/habits/public/')['X-Cache'], 'HIT')
+        response = self.client.get('/habits/public/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 1)
+
+        self.client.get('/habits/public/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Habit.objects.get(pk=self.pleasure_habit.pk).save()
+            Habit.objects.create(owner=self.user, place=self.place, action=self.action, reward='yes')
+        self.assertEqual(self.client.get('/habits/public/')['X-Cache'], 'HIT')
+
+        # Повторное изменение признака на том же объекте сравнивается с сохраненным значением.
+        for is_public in (False, True, False):
+            self.client.get('/habits/public/')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.useful_habit.is_public = is_public
+                self.useful_habit.save()
+            self.assertEqual(self.client.get('/habits/public/')['X-Cache'], 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.useful_habit.save()
+        self.assertEqual(self.client.get('/habits/public/')['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.useful_habit.is_public = True
+            self.useful_habit.save()
+        self.client.get('/habits/public/')
+        self.client.get('/habits/public/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place.name = 'new_place'
+            self.place.save()
+            self.assertEqual(self.client.get('/habits/public/')['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/habits/public/')['X-Cache'], 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Habit.objects.get(pk=self.useful_habit.pk).delete()
+        response = self.client.get('/habits/public/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_conditional_list(self):
+        """ Тестирование условного получения списка привычек """
+        response = self.client.get('/habits/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(2):
+            response = self.client.get('/habits/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertNotEqual(self.client.get('/habits/?expand=action')['ETag'], etag)
+
+        self.useful_habit.reward = 'new_reward'
+        self.useful_habit.save()
+        response = self.client.get('/habits/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = self.client.get('/habits/?expand=action')['ETag']
+        self.action.name = 'new_action'
+        self.action.save()
+        response = self.client.get('/habits/?expand=action', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = self.client.get('/habits/places/')['ETag']
+        response = self.client.get('/habits/places/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        Place.objects.create(name='new_place')
+        response = self.client.get('/habits/places/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_conditional_retrieve(self):
+        """ Тестирование условного получения привычки """
+        response = self.client.get(f'/habits/{self.useful_habit.pk}/')
+        response = self.client.get(f'/habits/{self.useful_habit.pk}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(f'/habits/{self.useful_habit.pk}/',
+                                   HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(f'/habits/{self.useful_habit.pk}/?expand=owner')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+
+    def test_bulk_create_habits(self):
+        """ Тестирование пакетного создания привычек """
+        operations = [{'op': 'create', 'data': {'place': self.place.pk, 'action': self.action.pk, 'reward': str(i)}}
+                      for i in range(50)]
+        with self.assertNumQueries(7):
+            response = self.client.post('/habits/bulk/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual({result['status'] for result in results}, {'ok'})
+        self.assertEqual(Habit.objects.filter(owner=self.user, reward__in=[str(i) for i in range(50)]).count(), 50)
+        self.assertEqual(ScheduleOutbox.objects.filter(operation=ScheduleOutbox.SET).count(), 50)
+
+        process_schedule_outbox()
+        self.assertTrue(PeriodicTask.objects.filter(name=str(results[0]['id'])).exists())
+
+    def test_bulk_habit_operations(self):
+        """ Тестирование пакетного изменения и удаления привычек с ошибками """
+        operations = [
+            {'op': 'update', 'id': self.useful_habit.pk, 'data': {'reward': 'new_reward'}},
+            {'op': 'delete', 'id': self.pleasure_habit.pk},
+            {'op': 'create', 'data': {'place': self.place.pk, 'action': 0, 'reward': 'yes'}},
+            {'op': 'delete', 'id': 0},
+        ]
+        response = self.client.post('/habits/bulk/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['skipped', 'skipped', 'error', 'error'])
+        self.assertIn('action', results[2]['errors'])
+        self.useful_habit.refresh_from_db()
+        self.assertEqual(self.useful_habit.reward, 'yes')
+
+        response = self.client.post('/habits/bulk/', {'operations': operations, 'atomic': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok', 'error', 'error'])
+        self.useful_habit.refresh_from_db()
+        self.assertEqual(self.useful_habit.reward, 'new_reward')
+        self.assertFalse(Habit.objects.filter(pk=self.pleasure_habit.pk).exists())
+        self.assertTrue(ScheduleOutbox.objects.filter(habit_id=self.pleasure_habit.pk,
+                                                      operation=ScheduleOutbox.DELETE).exists())
+
+    def test_validate_habit_list(self):
+        """ Тестирование валидации списка привычек с постоянным количеством запросов """
+        for size in (5, 50):
+            data = [{'place': self.place.pk, 'action': self.action.pk, 'pleasure_habit': self.pleasure_habit.pk}
+                    for _ in range(size)]
+            data.append({'place': self.place.pk, 'action': self.action.pk, 'pleasure_habit': self.useful_habit.pk})
+            data.append({'place': self.place.pk, 'action': self.action.pk, 'reward': 'yes', 'periodicity': 8})
+            serializer = HabitSerializer(data=data, many=True)
+            with self.assertNumQueries(3):
+                self.assertFalse(serializer.is_valid())
+            self.assertEqual(serializer.errors[:size], [{}] * size)
+            self.assertEqual(serializer.errors[size]['non_field_errors'],
+                             ['В связанные привычки могут попадать только привычки с признаком приятной привычки!'])
+            self.assertEqual(serializer.errors[size + 1]['non_field_errors'],
+                             ['Нельзя выполнять привычку реже, чем 1 раз в 7 дней!'])
+
+    def test_sparse_fields(self):
+        """ Тестирование выбора полей ответа """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/habits/?fields=id,action,time_to_perform')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'action', 'time_to_perform'})
+        self.assertNotIn('"habits_habit"."reward"', queries[-1]['sql'])
+
+        response = self.client.get(f'/habits/{self.useful_habit.pk}/?omit=reward,owner&expand=place')
+        self.assertNotIn('reward', response.json())
+        self.assertNotIn('owner', response.json())
+        self.assertEqual(response.json()['place']['name'], self.place.name)
+
+        response = self.client.get('/habits/?fields=id,next_due_at')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fast_serialization(self):
+        """ Тестирование совпадения быстрого формирования списков с ответом сериализатора """
+        Habit.objects.filter(pk=self.useful_habit.pk).update(is_public=True)
+        urls = ['/habits/', '/habits/?pagination=cursor&page_size=1', '/habits/?fields=id,time_to_perform',
+                '/habits/?expand=place', '/habits/places/', '/habits/actions/?omit=description']
+        for url in urls:
+            expected = self.client.get(url).content
+            with patch.object(settings, 'HABITS_FAST_SERIALIZATION', True):
+                self.assertEqual(self.client.get(url).content, expected)
+
+        serializer = HabitSerializer(many=True, context={'expand': ['place']})
+        self.assertIsNone(ValuesRepresentation.build(serializer.child))
+
+    def test_renderers(self):
+        """ Тестирование ответов и запросов в формате orjson и MessagePack """
+        data = self.client.get('/habits/').data
+        data['results'][0]['reward'] = 'строка\u2028'
+        now = timezone.now().replace(microsecond=123456, tzinfo=pytz.utc)
+        data['results'][0]['raw'] = [now, now.date(), now.time(), timezone.localtime(now)]
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        data = {'stats': {1: 'one', 2.5: 'two', None: 'none'}}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+        response = self.client.get('/habits/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)['count'], 2)
+
+        operations = [{'op': 'create', 'data': {'place': self.place.pk, 'action': self.action.pk, 'reward': 'yes'}}]
+        response = self.client.post('/habits/bulk/', msgpack.packb({'operations': operations}),
+                                    content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post('/habits/bulk/', b'{"operations": [', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_habits(self):
+        """ Тестирование потоковой выгрузки привычек """
+        response = self.client.get('/habits/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.useful_habit.pk, self.pleasure_habit.pk])
+        self.assertEqual(rows[0]['place'], self.place.name)
+
+        response = self.client.get('/habits/export/?output=csv')
+        with self.assertNumQueries(0):
+            header = next(response.streaming_content)
+        self.assertEqual(header.decode().strip().split(','), list(EXPORT_FIELDS))
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+
+        other_user = User.objects.create(email='other@test.ru')
+        self.client.force_authenticate(other_user)
+        response = self.client.get('/habits/export/')
+        self.assertEqual(b''.join(response.streaming_content), b'')
+        response = self.client.get('/habits/export/?output=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_habits(self):
+        """ Тестирование загрузки привычек из файла с продолжением с контрольной точки """
+        rows = [
+            {'place': self.place.name, 'action': 'import_action', 'reward': 'yes', 'is_public': True},
+            {'place': 'import_place', 'action': self.action.name, 'reward': 'yes', 'periodicity': 8},
+            {'place': 'import_place', 'action': 'import_action', 'pleasure_habit': self.pleasure_habit.pk,
+             'time_to_perform': '2024-01-02T08:30:00+03:00'},
+            {'place': 'import_place', 'action': 'import_action', 'reward': 'yes', 'time_to_perform': 'tomorrow'},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'habits.ndjson')
+            with open(path, 'w') as file:
+                file.writelines(json.dumps(row) + '\n' for row in rows)
+                file.write('{"place": \n[1, 2]\n{"place": ["import_place"]}\n')
+            with open(f'{path}.checkpoint', 'w') as file:
+                json.dump({'line': 1, 'imported': 1, 'errors': 0}, file)
+
+            stdout, stderr = StringIO(), StringIO()
+            call_command('import_habits', path, owner=self.user.email, stdout=stdout, stderr=stderr)
+            self.assertIn('Загружено привычек: 1, строк с ошибками: 5', stdout.getvalue())
+            for line in range(4, 8):
+                self.assertIn(f'Строка {line}', stderr.getvalue())
+            self.assertIn('Строка 2', stderr.getvalue())
+            self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+            habit = Habit.objects.get(pleasure_habit=self.pleasure_habit)
+            self.assertEqual((habit.place.name, habit.action.name), ('import_place', 'import_action'))
+            self.assertEqual(habit.time_to_perform.isoformat(), '2024-01-02T05:30:00+00:00')
+            self.assertTrue(ScheduleOutbox.objects.filter(habit_id=habit.pk, operation=ScheduleOutbox.SET).exists())
+
+            path = os.path.join(directory, 'habits.csv')
+            with open(path, 'wb') as file:
+                file.writelines(self.client.get('/habits/export/?output=csv').streaming_content)
+            call_command('import_habits', path, stdout=StringIO(), stderr=StringIO())
+            imported = Habit.objects.filter(owner=self.user, place=habit.place)
+            self.assertEqual(imported.count(), 2)
+            self.assertEqual(set(imported.values_list('time_to_perform', flat=True)), {habit.time_to_perform})
+
+    def clear_completions(self):
+        redis = get_redis()
+        keys = list(redis.scan_iter('test:habits:completion*'))
+        if keys:
+            redis.delete(*keys)
+
+    @patch('habits.completions.COMPLETIONS_KEY', 'test:habits:completions')
+    @patch('habits.completions.COMPLETION_KEY_PREFIX', 'test:habits:completion')
+    def test_habit_completions(self):
+        """ Тестирование отметок о выполнении привычки через буфер redis """
+        self.clear_completions()
+        self.addCleanup(self.clear_completions)
+        habit = self.useful_habit
+        habit.periodicity = 3
+        habit.save()
+        completed_at = habit.time_to_perform + timedelta(days=4)
+        self.assertEqual(get_period_date(habit, completed_at), (habit.time_to_perform + timedelta(days=3)).date())
+        # Периодичность 0 допускается API и, как и для напоминаний, считается ежедневной
+        habit.periodicity = 0
+        self.assertEqual(get_period_date(habit, completed_at), completed_at.astimezone(
+            pytz.timezone(settings.TIME_ZONE)).date())
+        habit.periodicity = 3
+
+        with patch('habits.views.flush_habit_completions.delay') as mock_delay:
+            response = self.client.post(f'/habits/{habit.pk}/complete/')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertTrue(response.json()['created'])
+            response = self.client.post(f'/habits/{habit.pk}/complete/')
+            self.assertFalse(response.json()['created'])
+            mock_delay.assert_not_called()
+        self.assertFalse(HabitCompletion.objects.exists())
+
+        # Отметки всех привычек записываются одним запросом вставки, статистика обновляется одной пачкой запросов,
+        # отметки удаленных привычек пропускаются
+        Habit.objects.filter(pk=self.pleasure_habit.pk).update(periodicity=0)
+        response = self.client.post(f'/habits/{self.pleasure_habit.pk}/complete/')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        deleted_habit = Habit.objects.create(owner=self.user, place=self.place, action=self.action)
+        self.client.post(f'/habits/{deleted_habit.pk}/complete/')
+        deleted_habit.delete()
+        with self.assertNumQueries(7):
+            self.assertEqual(flush_completions(10), 3)
+        self.assertEqual(flush_habit_completions(), 0)
+        self.assertEqual(HabitCompletion.objects.count(), 2)
+
+        response = self.client.get(f'/habits/{habit.pk}/completions/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([completion['source'] for completion in response.json()['results']], [HabitCompletion.API])
+
+    @patch('habits.completions.COMPLETIONS_KEY', 'test:habits:completions')
+    @patch('habits.completions.COMPLETION_KEY_PREFIX', 'test:habits:completion')
+    def test_habit_completions_worker_crash(self):
+        """ Тестирование восстановления отметок после падения воркера между извлечением из буфера и фиксацией """
+        self.clear_completions()
+        self.addCleanup(self.clear_completions)
+        enqueue_completion(self.useful_habit, HabitCompletion.API)
+
+        with patch('habits.completions.update_stats', side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                flush_completions(10)
+        self.assertFalse(HabitCompletion.objects.exists())
+        self.assertEqual(get_redis().llen('test:habits:completions'), 0)
+        # Повторная отметка за период не создается, но извлеченная отметка не потеряна
+        self.assertEqual(enqueue_completion(self.useful_habit, HabitCompletion.API)[1], 0)
+
+        # Список обработки еще не устарел, отметка в нем дожидается завершения воркера
+        self.assertEqual(flush_habit_completions(), 0)
+        with patch.object(settings, 'HABITS_COMPLETION_PROCESSING_TIMEOUT', 0):
+            self.assertEqual(flush_habit_completions(), 1)
+        self.assertTrue(HabitCompletion.objects.filter(habit=self.useful_habit).exists())
+        self.assertEqual(get_redis().zcard('test:habits:completions:processing'), 0)
+
+    @patch('habits.completions.COMPLETIONS_KEY', 'test:habits:completions')
+    @patch('habits.completions.COMPLETION_KEY_PREFIX', 'test:habits:completion')
+    @patch.object(settings, 'TELEGRAM_WEBHOOK_SECRET', 'secret')
+    def test_telegram_webhook(self):
+        """ Тестирование отметки о выполнении привычки кнопкой в напоминании telegram """
+        self.clear_completions()
+        self.addCleanup(self.clear_completions)
+        self.user.telegram_chat_id = 12345
+        self.user.save()
+        message = get_messages([self.useful_habit])[0]
+        callback_data = get_reply_markup(message)['reply_markup']['inline_keyboard'][0][0]['callback_data']
+        self.assertEqual(callback_data, f'done:{self.useful_habit.pk}')
+
+        self.client.credentials()
+        update = {'update_id': 1, 'callback_query': {'id': '1', 'from': {'id': 12345}, 'data': callback_data,
+                                                     'message': {'chat': {'id': 12345}}}}
+        response = self.client.post('/habits/telegram/webhook/', update, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.post('/habits/telegram/webhook/', update, format='json',
+                                    HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='secret')
+        self.assertEqual(response.json(), {'method': 'answerCallbackQuery', 'callback_query_id': '1',
+                                           'text': 'Выполнение отмечено'})
+        update['callback_query']['message']['chat']['id'] = 1
+        response = self.client.post('/habits/telegram/webhook/', update, format='json',
+                                    HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='secret')
+        self.assertEqual(response.json()['text'], 'Привычка не найдена')
+
+        # Обновления без нужных полей или неверных типов пропускаются без ошибки сервера.
+        for body in ({'update_id': 2}, {'callback_query': 'done:1'}, {'callback_query': {'data': callback_data}},
+                     {'callback_query': {'id': '2', 'data': callback_data, 'message': []}},
+                     {'callback_query': {'id': '2', 'data': callback_data, 'from': {'id': [12345]}}}):
+            response = self.client.post('/habits/telegram/webhook/', body, format='json',
+                                        HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='secret')
+            self.assertEqual((response.status_code, response.json()), (status.HTTP_200_OK, {}))
+        response = self.client.post('/habits/telegram/webhook/', [update], format='json',
+                                    HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        flush_habit_completions()
+        self.assertEqual(HabitCompletion.objects.get().source, HabitCompletion.TELEGRAM)
+
+    @patch('habits.completions.COMPLETIONS_KEY', 'test:habits:completions')
+    @patch('habits.completions.COMPLETION_KEY_PREFIX', 'test:habits:completion')
+    def test_habit_stats(self):
+        """ Тестирование инкрементального расчета серий и доли выполненных периодов """
+        self.clear_completions()
+        self.addCleanup(self.clear_completions)
+        habit = self.useful_habit
+        for days in (0, 1, 2, 4):
+            enqueue_completion(habit, HabitCompletion.API, habit.time_to_perform + timedelta(days=days))
+        flush_habit_completions()
+
+        start = get_period_date(habit, habit.time_to_perform)
+        stats = get_habit_stats(Habit.objects.select_related('stats').get(pk=habit.pk), start + timedelta(days=5))
+        self.assertEqual((stats['current_streak'], stats['longest_streak']), (1, 3))
+        self.assertEqual((stats['completion_rate_7d'], stats['completion_rate_30d']), (0.67, 0.67))
+        self.assertEqual(expire_streaks(start + timedelta(days=6)), 1)
+        self.assertEqual(HabitStats.objects.get(habit=habit).current_streak, 0)
+
+        HabitStats.objects.update(longest_streak=0)
+        call_command('rebuild_habit_stats', chunk_size=1, stdout=StringIO())
+        self.assertEqual(HabitStats.objects.get(habit=habit).longest_streak, 3)
+        self.assertEqual(HabitStats.objects.get(habit=self.pleasure_habit).longest_streak, 0)
+
+        response = self.client.get('/habits/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([stats['habit'] for stats in response.json()['results']], [habit.pk, self.pleasure_habit.pk])
+        response = self.client.get('/habits/stats/summary/')
+        self.assertEqual((response.json()['habits'], response.json()['longest_streak']), (2, 3))
+
+        # Периодичность 0 допускается API и считается ежедневной
+        Habit.objects.filter(pk=self.pleasure_habit.pk).update(periodicity=0)
+        response = self.client.get('/habits/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][1]['completion_rate_7d'], 0)
+        response = self.client.get('/habits/stats/summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = HabitStats(habit_id=self.pleasure_habit.pk)
+        apply_completion(stats, 0, start)
+        self.assertEqual((stats.current_streak, stats.streak_expires), (1, start + timedelta(days=2)))
+
+    @patch('habits.popularity.POPULARITY_KEY', 'test:habits:popularity')
+    @patch('habits.popularity.POPULARITY_LOCK_KEY', 'test:habits:popularity:lock')
+    def test_habit_popularity(self):
+        """ Тестирование списков популярности из кэша с ограничением возраста """
+        self.addCleanup(cache.delete, 'test:habits:popularity')
+        cache.delete('test:habits:popularity')
+        other_action = Action.objects.create(name='other_action')
+        Habit.objects.filter(pk=self.useful_habit.pk).update(is_public=True)
+        Habit.objects.create(owner=self.user, place=self.place, action=other_action, reward='yes', is_public=True)
+        Habit.objects.create(owner=self.user, place=self.place, action=other_action, reward='yes', is_public=True)
+        HabitCompletion.objects.create(habit=self.useful_habit, date=timezone.localdate(), completed_at=timezone.now())
+
+        response = self.client.get('/habits/popular/actions/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(action['name'], action['habits']) for action in response.json()['results']],
+                         [('other_action', 2), ('test_action', 1)])
+        response = self.client.get('/habits/popular/places/')
+        self.assertEqual(response.json()['results'][0]['habits'], 3)
+        response = self.client.get('/habits/popular/habits/')
+        self.assertEqual([habit['id'] for habit in response.json()['results']], [self.useful_habit.pk])
+
+        # Списки не старше HABITS_POPULARITY_MAX_AGE отдаются из кэша, запрос выполняется только для авторизации
+        Habit.objects.filter(action=other_action).update(is_public=False)
+        with self.assertNumQueries(1):
+            response = self.client.get('/habits/popular/actions/')
+        self.assertEqual(len(response.json()['results']), 2)
+        with patch.object(settings, 'HABITS_POPULARITY_MAX_AGE', 0):
+            response = self.client.get('/habits/popular/actions/')
+        self.assertEqual([action['name'] for action in response.json()['results']], ['test_action'])
+
+        # При пустом кэше запрос, не получивший блокировку, не пересчитывает списки, а ждет их.
+        cache.delete('test:habits:popularity')
+        cache.add('test:habits:popularity:lock', 1)
+        self.addCleanup(cache.delete, 'test:habits:popularity:lock')
+        with patch('habits.popularity.POPULARITY_WAIT', 0.2), self.assertNumQueries(1):
+            response = self.client.get('/habits/popular/actions/')
+        self.assertEqual(response.json(), {'generated_at': None, 'results': []})
+
     # def test_has_permission_user_is_owner(self):
     #     user = self.user
     #     user.is_staff = False
@@ -265,5 +1032,73 @@ class HabitTestCase(APITestCase):
     #     self.assertTrue(permission.has_permission(request, view))
 
 
+class TelegramStubHandler(BaseHTTPRequestHandler):
+    """ Заглушка Bot API: запоминает запросы и отвечает заранее заданными кодами. """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.received.append({'path': self.path, 'body': body, 'client': self.client_address})
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if body['chat_id'] in self.server.failing_chats:
+            status = 400
+        payload = {'ok': True} if status == 200 else {'ok': False, 'parameters': {'retry_after': 0}}
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TelegramSenderTestCase(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), TelegramStubHandler)
+        self.server.received = []
+        self.server.statuses = []
+        self.server.failing_chats = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_send_message(self):
+        """ Тестирование отправки сообщений через пул постоянных соединений """
+        sender = TelegramSender(api_url=self.api_url, token='token')
+        self.assertEqual(sender.send_message(1, 'first').status_code, 200)
+        self.assertEqual(sender.send_message(2, 'second').status_code, 200)
+        self.assertEqual([request['path'] for request in self.server.received], ['/bottoken/sendMessage'] * 2)
+        self.assertEqual(self.server.received[1]['body'], {'chat_id': 2, 'text': 'second'})
+        # Оба сообщения отправлены через одно и то же соединение
+        self.assertEqual(self.server.received[0]['client'], self.server.received[1]['client'])
+
+    def test_send_message_retry(self):
+        """ Тестирование повторной отправки сообщения при ответе 429 """
+        self.server.statuses = [429]
+        sender = TelegramSender(api_url=self.api_url, token='token')
+        self.assertEqual(sender.send_message(1, 'text').status_code, 200)
+        self.assertEqual(len(self.server.received), 2)
 
+    def test_rate_limiter(self):
+        """ Тестирование ограничения частоты отправки сообщений в один чат """
+        rate_limiter = RateLimiter(global_rate=30, chat_rate=1, key_prefix=f'test:rate:{self.server.server_port}')
+        self.assertTrue(rate_limiter.acquire(1, timeout=0))
+        self.assertFalse(rate_limiter.acquire(1, timeout=0))
+        self.assertTrue(rate_limiter.acquire(2, timeout=0))
 
+    def test_send_telegram_messages(self):
+        """ Тестирование отправки пачки напоминаний с результатом по каждому сообщению """
+        self.server.failing_chats = {2}
+        sender = TelegramSender(api_url=self.api_url, token='token')
+        messages = [{'chat_id': chat_id, 'action': 'action', 'time': '10:00:00', 'place': 'place'} for chat_id in (1, 2, 3)]
+        with patch('habits.tasks.get_sender', return_value=sender):
+            results = send_telegram_messages(messages)
+        self.assertEqual([result['ok'] for result in results], [True, False, True])
+        self.assertEqual(len(self.server.received), 3)
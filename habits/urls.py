@@ -3,7 +3,9 @@ from rest_framework import routers
 
 from habits.apps import HabitsConfig
 from habits.views import PlaceViewSet, ActionViewSet, HabitListAPIView, HabitCreateAPIView, HabitRetrieveAPIView, \
-    HabitUpdateAPIView, HabitDestroyAPIView, HabitPublicListAPIView
+    HabitUpdateAPIView, HabitDestroyAPIView, HabitPublicListAPIView, HabitPublicCacheStatsAPIView, HabitBulkAPIView, \
+    HabitExportAPIView, HabitCompleteAPIView, HabitCompletionListAPIView, TelegramWebhookAPIView, HabitStatsListAPIView, \
+    HabitUserStatsAPIView, HabitPopularityAPIView
 
 app_name = HabitsConfig.name
 
@@ -13,9 +15,20 @@ router.register('actions', ActionViewSet, basename='actions')
 
 urlpatterns = [
     path('', HabitListAPIView.as_view(), name='habit_list'),
+    path('stats/', HabitStatsListAPIView.as_view(), name='habit_stats'),
+    path('stats/summary/', HabitUserStatsAPIView.as_view(), name='habit_user_stats'),
     path('public/', HabitPublicListAPIView.as_view(), name='habit_public_list'),
+    path('popular/actions/', HabitPopularityAPIView.as_view(section='actions'), name='habit_popular_actions'),
+    path('popular/places/', HabitPopularityAPIView.as_view(section='places'), name='habit_popular_places'),
+    path('popular/habits/', HabitPopularityAPIView.as_view(section='trending'), name='habit_popular_habits'),
+    path('public/cache-stats/', HabitPublicCacheStatsAPIView.as_view(), name='habit_public_cache_stats'),
     path('create/', HabitCreateAPIView.as_view(), name='habits_list'),
+    path('bulk/', HabitBulkAPIView.as_view(), name='habit_bulk'),
+    path('export/', HabitExportAPIView.as_view(), name='habit_export'),
+    path('telegram/webhook/', TelegramWebhookAPIView.as_view(), name='telegram_webhook'),
     path('<int:pk>/', HabitRetrieveAPIView.as_view(), name='habit'),
     path('<int:pk>/update/', HabitUpdateAPIView.as_view(), name='habit_update'),
     path('<int:pk>/delete/', HabitDestroyAPIView.as_view(), name='habit_delete'),
+    path('<int:pk>/complete/', HabitCompleteAPIView.as_view(), name='habit_complete'),
+    path('<int:pk>/completions/', HabitCompletionListAPIView.as_view(), name='habit_completions'),
 ] + router.urls
@@ -1,7 +1,5 @@
 from rest_framework.serializers import ValidationError
 
-from habits.models import Habit
-
 
 class RewardValidator:
     """
@@ -13,7 +11,6 @@ class RewardValidator:
         self.fields = fields_list
 
     def __call__(self, value):
-        print(value)
         if not value.get('is_pleasure'):
             if not value.get(self.fields[0]) and not value.get(self.fields[1]):
                 raise ValidationError("У привычки должно быть вознаграждение или связанная привычка!")
@@ -33,15 +30,17 @@ class TimeToCompleteValidator:
 
 
 class PleasureHabitValidator:
-    """ Исключает добавление связанной привычки без признака приятной привычки. """
+    """
+    Исключает добавление связанной привычки без признака приятной привычки.
+    Связанная привычка уже загружена полем сериализатора, поэтому запрос к базе не нужен.
+    """
 
     def __init__(self, field):
         self.field = field
 
     def __call__(self, value):
-        if value.get(self.field):
-            habit_pk = dict(value).get(self.field).pk
-            habit = Habit.objects.get(pk=habit_pk)
+        habit = value.get(self.field)
+        if habit:
             if not habit.is_pleasure:
                 raise ValidationError(
                     "В связанные привычки могут попадать только привычки с признаком приятной привычки!")
@@ -78,10 +77,10 @@ def patch_validator(habit, validated_data):
     """
 
     if 'is_pleasure' in validated_data:
-        if habit.reward or habit.pleasure_habit:
+        if habit.reward or habit.pleasure_habit_id:
             raise ValidationError(
                 "У привычки есть вознаграждение или связанная привычка, поэтому она не может быть приятной!")
     if habit.reward and validated_data.get('pleasure_habit'):
         raise ValidationError("У привычки есть вознаграждение, у нее не может быть связанной привычки!")
-    if habit.pleasure_habit and validated_data.get('reward'):
+    if habit.pleasure_habit_id and validated_data.get('reward'):
         raise ValidationError("У привычки есть связанная привычка, у нее не может быть вознаграждения!")
@@ -1,21 +1,39 @@
-from rest_framework import viewsets, generics
-from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework import viewsets, generics, status
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.response import Response
+from rest_framework.serializers import ValidationError
+from rest_framework.views import APIView
 
-from habits.models import Place, Action, Habit
+from config import settings
+from habits.bulk import apply_habit_operations
+from habits.cache import get_public_feed_page, set_public_feed_page, get_public_feed_stats
+from habits.completions import enqueue_completion
+from habits.export import get_export_rows, stream_ndjson, stream_csv
+from habits.mixins import ExpandViewMixin, ConditionalGetMixin, SparseFieldsViewMixin, ValuesListMixin, \
+    TrigramSearchViewMixin
+from habits.models import Place, Action, Habit, ScheduleOutbox, HabitCompletion
 from habits.paginators import HabitPaginator, PlacePaginator, ActionPaginator
 from habits.permissions import IsOwnerOrStaff
-from habits.serializers import PlaceSerializer, ActionSerializer, HabitSerializer
-from habits.services import set_schedule, delete_schedule
+from habits.popularity import get_popularity
+from habits.serializers import PlaceSerializer, ActionSerializer, HabitSerializer, HabitBulkSerializer, \
+    HabitCompletionSerializer
+from habits.stats import get_habit_stats, get_user_stats
+from habits.tasks import enqueue_schedule_changes, flush_habit_completions
 
 
-class PlaceViewSet(viewsets.ModelViewSet):
+class PlaceViewSet(TrigramSearchViewMixin, ConditionalGetMixin, SparseFieldsViewMixin, ValuesListMixin,
+                   viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
     queryset = Place.objects.all()
     serializer_class = PlaceSerializer
     pagination_class = PlacePaginator
 
 
-class ActionViewSet(viewsets.ModelViewSet):
+class ActionViewSet(TrigramSearchViewMixin, ConditionalGetMixin, SparseFieldsViewMixin, ValuesListMixin,
+                    viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
     queryset = Action.objects.all()
     serializer_class = ActionSerializer
@@ -28,37 +46,147 @@ class HabitCreateAPIView(generics.CreateAPIView):
 
     def perform_create(self, serializer, **kwargs):
         """
-        Сохраняет авторизованного пользователя в объекте привычки,
-        создает периодическую задачу если привычка не является приятной.
+        Сохраняет привычку с авторизованным пользователем в качестве создателя
+        и в той же транзакции записывает в outbox создание расписания для нее.
         """
 
-        new_habit = serializer.save()
-        new_habit.owner = self.request.user
-        new_habit.save()
+        with transaction.atomic():
+            new_habit = serializer.save(owner=self.request.user)
+            enqueue_schedule_changes([new_habit.pk], ScheduleOutbox.SET)
 
-        set_schedule(habit=new_habit)
+
+class HabitBulkAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        """
+        Выполняет список операций создания, изменения и удаления привычек в одной транзакции.
+        При atomic=true и ошибке в любой операции ничего не изменяется и возвращается 400.
+        """
+
+        serializer = HabitBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        atomic = serializer.validated_data['atomic']
+        results = apply_habit_operations(request.user, serializer.validated_data['operations'], atomic)
+        failed = any(result['status'] == 'error' for result in results)
+        response_status = status.HTTP_400_BAD_REQUEST if atomic and failed else status.HTTP_200_OK
+        return Response({'results': results}, status=response_status)
 
 
-class HabitListAPIView(generics.ListAPIView):
+class HabitListAPIView(ConditionalGetMixin, SparseFieldsViewMixin, ExpandViewMixin, ValuesListMixin,
+                       generics.ListAPIView):
     permission_classes = (IsAuthenticated,)
+    queryset = Habit.objects.all()
     serializer_class = HabitSerializer
     pagination_class = HabitPaginator
 
     def get_queryset(self):
         """ Получает только привычки владельца. """
 
-        queryset = Habit.objects.filter(owner=self.request.user)
+        queryset = super().get_queryset().filter(owner=self.request.user)
         return queryset
 
 
-class HabitPublicListAPIView(generics.ListAPIView):
+class HabitStatsListAPIView(generics.ListAPIView):
+    permission_classes = (IsAuthenticated,)
+    pagination_class = HabitPaginator
+
+    def get_queryset(self):
+        """ Получает привычки владельца вместе с их статистикой одним запросом. """
+
+        return Habit.objects.filter(owner=self.request.user).select_related('stats')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Возвращает текущую и самую длинную серию выполненных периодов и долю выполненных периодов
+        за 7 и 30 дней по каждой привычке владельца из заранее рассчитанной статистики.
+        """
+
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response([get_habit_stats(habit) for habit in page])
+
+
+class HabitUserStatsAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        """ Возвращает статистику пользователя, собранную из статистики всех его привычек. """
+
+        return Response(get_user_stats(list(Habit.objects.filter(owner=request.user).select_related('stats'))))
+
+
+class HabitPublicListAPIView(SparseFieldsViewMixin, ExpandViewMixin, ValuesListMixin, generics.ListAPIView):
     permission_classes = (IsAuthenticated,)
     queryset = Habit.objects.filter(is_public=True)
     serializer_class = HabitSerializer
     pagination_class = HabitPaginator
 
+    def list(self, request, *args, **kwargs):
+        """
+        Отдает страницу ленты из кэша, при промахе формирует ее и сохраняет в кэш.
+        Лента одинакова для всех пользователей, поэтому ключ кэша зависит только от параметров запроса.
+        """
+
+        key, data = get_public_feed_page(request)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        response = super().list(request, *args, **kwargs)
+        set_public_feed_page(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class HabitExportAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+    output_query_param = 'output'
+    outputs = {
+        'ndjson': (stream_ndjson, 'application/x-ndjson'),
+        'csv': (stream_csv, 'text/csv'),
+    }
+
+    def get(self, request):
+        """
+        Выгружает привычки пользователя, а для персонала все привычки, потоком в формате NDJSON или CSV
+        (параметр output). Формат не задается параметром format, так как его использует выбор формата ответа DRF.
+        """
+
+        output = request.query_params.get(self.output_query_param, 'ndjson')
+        if output not in self.outputs:
+            raise ValidationError({self.output_query_param: f'Допустимые значения: {", ".join(self.outputs)}'})
+        stream, content_type = self.outputs[output]
+
+        queryset = Habit.objects.all()
+        if not request.user.is_staff:
+            queryset = queryset.filter(owner=request.user)
+        response = StreamingHttpResponse(stream(get_export_rows(queryset)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="habits.{output}"'
+        return response
+
+
+class HabitPopularityAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+    section = None
+
+    def get(self, request):
+        """
+        Возвращает заранее рассчитанный список популярности (section): действия и места, чаще всего используемые
+        в публичных привычках, или публичные привычки с наибольшим количеством отметок за неделю.
+        """
+
+        data = get_popularity()
+        return Response({'generated_at': data['generated_at'], 'results': data[self.section]})
 
-class HabitRetrieveAPIView(generics.RetrieveAPIView):
+
+class HabitPublicCacheStatsAPIView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """ Возвращает количество попаданий и промахов кэша ленты публичных привычек. """
+
+        return Response(get_public_feed_stats())
+
+
+class HabitRetrieveAPIView(ConditionalGetMixin, SparseFieldsViewMixin, ExpandViewMixin, generics.RetrieveAPIView):
     permission_classes = (IsAuthenticated, IsOwnerOrStaff,)
     queryset = Habit.objects.all()
     serializer_class = HabitSerializer
@@ -70,11 +198,11 @@ class HabitUpdateAPIView(generics.UpdateAPIView):
     serializer_class = HabitSerializer
 
     def perform_update(self, serializer):
-        """ Удаляет и создает периодическую задачу с новыми данными. """
+        """ Сохраняет привычку и в той же транзакции записывает в outbox пересоздание расписания для нее. """
 
-        habit = serializer.save()
-        delete_schedule(habit_pk=habit.pk)
-        set_schedule(habit=habit)
+        with transaction.atomic():
+            habit = serializer.save()
+            enqueue_schedule_changes([habit.pk], ScheduleOutbox.SET)
 
 
 class HabitDestroyAPIView(generics.DestroyAPIView):
@@ -83,7 +211,121 @@ class HabitDestroyAPIView(generics.DestroyAPIView):
     serializer_class = HabitSerializer
 
     def perform_destroy(self, instance):
-        """ Удаляет периодическую задачу. """
+        """ Удаляет привычку и в той же транзакции записывает в outbox удаление расписания для нее. """
+
+        with transaction.atomic():
+            enqueue_schedule_changes([instance.pk], ScheduleOutbox.DELETE)
+            super().perform_destroy(instance)
+
+
+# Поля привычки, необходимые для отметки о выполнении.
+COMPLETION_HABIT_FIELDS = ('pk', 'owner', 'time_to_perform', 'periodicity')
+
+
+def complete_habit(habit, source):
+    """
+    Добавляет отметку о выполнении привычки в буфер и запускает запись в базу, когда набирается пачка.
+    Возвращает дату начала периода и признак новой отметки.
+    """
+
+    period_date, length = enqueue_completion(habit, source)
+    if length == settings.HABITS_COMPLETION_BATCH_SIZE:
+        flush_habit_completions.delay()
+    return period_date, bool(length)
+
+
+class HabitCompleteAPIView(generics.GenericAPIView):
+    permission_classes = (IsAuthenticated, IsOwnerOrStaff,)
+    queryset = Habit.objects.only(*COMPLETION_HABIT_FIELDS)
+
+    def get_object(self):
+        """ Загружает привычку один раз для проверки прав и отметки. """
+
+        if not hasattr(self, '_habit'):
+            self._habit = super().get_object()
+        return self._habit
+
+    def post(self, request, pk):
+        """
+        Отмечает выполнение привычки в текущем периоде. Отметка записывается в базу пачкой в фоне,
+        повторная отметка за тот же период не создает новую запись.
+        """
+
+        period_date, created = complete_habit(self.get_object(), HabitCompletion.API)
+        return Response({'habit': pk, 'date': period_date, 'created': created}, status=status.HTTP_202_ACCEPTED)
+
+
+class HabitCompletionListAPIView(generics.ListAPIView):
+    permission_classes = (IsAuthenticated, IsOwnerOrStaff,)
+    serializer_class = HabitCompletionSerializer
+    pagination_class = HabitPaginator
+
+    def get_object(self):
+        """ Возвращает привычку, отметки которой запрошены, для проверки прав. """
+
+        return generics.get_object_or_404(Habit.objects.only('pk', 'owner'), pk=self.kwargs['pk'])
+
+    def get_queryset(self):
+        """ Возвращает отметки о выполнении привычки по индексу (habit, date), последние периоды первыми. """
+
+        return HabitCompletion.objects.filter(habit_id=self.kwargs['pk']).order_by('-date')
+
+
+class TelegramWebhookAPIView(APIView):
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    secret_header = 'HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN'
+
+    def post(self, request):
+        """
+        Принимает обновления бота. Нажатие кнопки «Выполнено» в напоминании (callback_data done:<pk>)
+        отмечает выполнение привычки, если чат принадлежит ее создателю.
+        Ответ на нажатие возвращается в ответе вебхука методом answerCallbackQuery.
+        """
+
+        secret = settings.TELEGRAM_WEBHOOK_SECRET
+        if not secret or not constant_time_compare(request.META.get(self.secret_header, ''), secret):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        if not isinstance(request.data, dict):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        callback = self.get_callback(request.data)
+        if callback is None:
+            return Response({})
+
+        query_id, habit_pk, chat_id = callback
+        habit = None
+        if habit_pk.isdigit():
+            habit = Habit.objects.filter(pk=habit_pk, owner__telegram_chat_id=chat_id).only(
+                *COMPLETION_HABIT_FIELDS).first()
+        if habit is None:
+            text = 'Привычка не найдена'
+        else:
+            _, created = complete_habit(habit, HabitCompletion.TELEGRAM)
+            text = 'Выполнение отмечено' if created else 'Выполнение уже отмечено'
+        return Response({'method': 'answerCallbackQuery', 'callback_query_id': query_id, 'text': text})
+
+    def get_callback(self, update):
+        """
+        Возвращает идентификатор нажатия кнопки «Выполнено», идентификатор привычки и чат из обновления.
+        Для остальных обновлений и обновлений без нужных полей возвращает None, такие обновления пропускаются.
+        """
+
+        callback_query = update.get('callback_query')
+        if not isinstance(callback_query, dict):
+            return None
+        query_id, data, sender = callback_query.get('id'), callback_query.get('data'), callback_query.get('from')
+        if not isinstance(query_id, str) or not isinstance(data, str) or not data.startswith('done:'):
+            return None
+        message = callback_query.get('message')
+        chat = message.get('chat') if isinstance(message, dict) else None
+        if isinstance(chat, dict) and 'id' in chat:
+            chat_id = chat['id']
+        elif isinstance(sender, dict):
+            chat_id = sender.get('id')
+        else:
+            return None
+        if not isinstance(chat_id, int) or isinstance(chat_id, bool):
+            return None
+        return query_id, data.removeprefix('done:'), chat_id
 
-        delete_schedule(habit_pk=instance.pk)
-        super().perform_destroy(instance)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='coalesce_reminders',
+            field=models.BooleanField(default=True, verbose_name='объединять одновременные напоминания'),
+        ),
+    ]
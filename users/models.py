@@ -9,6 +9,7 @@ class User(AbstractUser):
 
     email = models.EmailField(unique=True, verbose_name='email')
     telegram_chat_id = models.IntegerField(unique=True, **NULLABLE, verbose_name='telegram chat_id')
+    coalesce_reminders = models.BooleanField(default=True, verbose_name='объединять одновременные напоминания')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
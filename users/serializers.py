@@ -6,7 +6,7 @@ from users.models import User
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['pk', 'email', 'last_name', 'first_name', 'password']
+        fields = ['pk', 'email', 'last_name', 'first_name', 'password', 'coalesce_reminders']
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
@@ -25,3 +25,11 @@ class UserSerializer(serializers.ModelSerializer):
             instance.set_password(validated_data['password'])
         instance.save()
         return instance
+
+
+class OwnerSerializer(serializers.ModelSerializer):
+    """ Публичные данные пользователя для вывода в привычках. """
+
+    class Meta:
+        model = User
+        fields = ['pk', 'first_name', 'last_name']
@@ -42,6 +42,15 @@ class UserTestCase(APITestCase):
         self.assertEqual(response.json().get('pk'), self.user.pk)
         self.assertEqual(response.json().get('email'), self.user.email)
 
+    def test_sparse_fields_user(self):
+        """ Тестирование выбора полей пользователя """
+        response = self.client.get(f'/users/{self.user.pk}/?fields=pk,email')
+        self.assertEqual(response.json(), {'pk': self.user.pk, 'email': self.user.email})
+        response = self.client.get('/users/?omit=email')
+        self.assertNotIn('email', response.json()[0])
+        response = self.client.get('/users/?fields=password')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_update_user(self):
         """ Тестирование изменения пользователя """
         data = {'first_name': 'test', 'last_name': 'test'}
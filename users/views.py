@@ -1,5 +1,7 @@
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+
+from habits.mixins import SparseFieldsViewMixin
 from users.models import User
 from users.permissions import IsOwnerOrStaff
 from users.serializers import UserSerializer
@@ -9,13 +11,13 @@ class UserRegister(generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
-class UserListAPIView(generics.ListAPIView):
+class UserListAPIView(SparseFieldsViewMixin, generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
 
-class UserRetrieveAPIView(generics.RetrieveAPIView):
+class UserRetrieveAPIView(SparseFieldsViewMixin, generics.RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrStaff]